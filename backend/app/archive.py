@@ -0,0 +1,226 @@
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from fastapi import HTTPException
+from sqlalchemy import Column, Index, MetaData, Table, literal, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+from .models import Order, OrderArchive, OrderItem
+
+
+# 冷热分离：下单超过 ARCHIVE_AFTER_DAYS 天的已付款订单连同订单项，按下单年份分批搬进归档库
+# （ARCHIVE_DIR/orders_<年>.db，表结构与主库相同），主库里只留近期和未结的订单。
+# 列表/分页/导出默认只查主库；请求的时间范围落进已归档的年份时，才把对应归档库 ATTACH 进来，UNION ALL 一起查。
+# 归档的订单只读；销售汇总表不受搬迁影响（删除触发器在搬迁期间跳过），照常包含归档订单。
+#   cd backend && python -m app.archive                 # 按 ARCHIVE_AFTER_DAYS 归档
+#   cd backend && python -m app.archive --days 730 --dry-run
+ARCHIVE_DIR = os.getenv("JXC_ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("JXC_ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = 2000
+ARCHIVED_STATUS = "已付款"
+
+# SQLite 默认一个连接最多 ATTACH 10 个库；超过时先 DETACH 本次用不到的
+MAX_ATTACHED = 10
+
+# 归档库不带 row_version：归档的订单不参与增量同步，行版本号也就没有意义
+ORDER_COLUMNS = [column.name for column in Order.__table__.columns if column.name != "row_version"]
+ITEM_COLUMNS = [column.name for column in OrderItem.__table__.columns if column.name != "row_version"]
+
+
+def schema_name(year: int) -> str:
+    return f"archive_{year}"
+
+
+def archive_path(year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"orders_{year}.db")
+
+
+def _copy_table(table: Table, metadata: MetaData, schema: str, names: list[str]) -> Table:
+    # names 里的列与相应索引照搬，不带外键（客户、商品表不在归档库里）
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in table.columns if c.name in names]
+    copy = Table(table.name, metadata, *columns, schema=schema)
+    for index in table.indexes:
+        if all(column.name in names for column in index.columns):
+            Index(index.name, *[copy.c[column.name] for column in index.columns], unique=index.unique)
+    return copy
+
+
+@lru_cache(maxsize=None)
+def archive_tables(year: int) -> tuple[Table, Table]:
+    # 归档库里的 orders / order_items，schema 即 ATTACH 时的别名
+    metadata = MetaData()
+    return (
+        _copy_table(Order.__table__, metadata, schema_name(year), ORDER_COLUMNS),
+        _copy_table(OrderItem.__table__, metadata, schema_name(year), ITEM_COLUMNS),
+    )
+
+
+def attach(conn, years) -> None:
+    # 让连接上挂着这些年份的归档库；已挂的不重复 ATTACH（连接在池里复用，挂载状态记在 conn.info 上）。
+    # ATTACH / DETACH 不能在写事务里执行，只在读查询之前或单独的连接上调用
+    wanted = sorted(set(years))
+    if len(wanted) > MAX_ATTACHED:
+        raise HTTPException(status_code=400, detail=f"查询范围跨越 {len(wanted)} 个归档年份，请缩小时间范围")
+    attached: dict[int, str] = conn.info.setdefault("archive_years", {})
+    missing = [year for year in wanted if year not in attached]
+    if not missing:
+        return
+    for year in [y for y in attached if y not in wanted][: max(0, len(attached) + len(missing) - MAX_ATTACHED)]:
+        conn.exec_driver_sql(f"DETACH DATABASE {schema_name(year)}")
+        del attached[year]
+    paths = dict(conn.execute(select(OrderArchive.year, OrderArchive.path).where(OrderArchive.year.in_(missing))).all())
+    for year in missing:
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {schema_name(year)}", (paths.get(year) or archive_path(year),))
+        attached[year] = schema_name(year)
+
+
+def archived_years(db: Session, start: datetime | None, end: datetime | None) -> list[int]:
+    # 与 [start, end) 有交集的归档年份；没有任何时间条件时返回空，只查主库
+    if start is None and end is None:
+        return []
+    query = db.query(OrderArchive.year)
+    if start is not None:
+        query = query.filter(OrderArchive.last_created_at >= start)
+    if end is not None:
+        query = query.filter(OrderArchive.first_created_at < end)
+    return [year for (year,) in query.order_by(OrderArchive.year)]
+
+
+def order_entities(db: Session, years: list[int]):
+    # 返回 (订单实体, 订单项实体)：没有归档年份时就是模型本身；否则是主库与各归档库 UNION ALL 后的别名，
+    # 外层的 WHERE 会被 SQLite 下推到每个分支里，各自走索引；归档库里没有的 row_version 补 0
+    if not years:
+        return Order, OrderItem
+    attach(db.connection(), years)
+    tables = [archive_tables(year) for year in years]
+    orders = union_all(
+        select(*[Order.__table__.c[name] for name in ORDER_COLUMNS], Order.__table__.c.row_version),
+        *[select(*[o.c[name] for name in ORDER_COLUMNS], literal(0).label("row_version")) for o, _ in tables],
+    ).subquery("orders")
+    items = union_all(
+        select(*[OrderItem.__table__.c[name] for name in ITEM_COLUMNS], OrderItem.__table__.c.row_version),
+        *[select(*[i.c[name] for name in ITEM_COLUMNS], literal(0).label("row_version")) for _, i in tables],
+    ).subquery("order_items")
+    return aliased(Order, orders, adapt_on_names=True), aliased(OrderItem, items, adapt_on_names=True)
+
+
+def years_holding(db: Session, order_ids) -> list[int]:
+    # 按归档目录的 id 范围找可能存着这些订单的年份（目录每年一行，直接在内存里比）
+    ranges = db.query(OrderArchive.year, OrderArchive.min_id, OrderArchive.max_id).order_by(OrderArchive.year).all()
+    return [year for year, lo, hi in ranges if any(lo <= order_id <= hi for order_id in order_ids)]
+
+
+def order_sources(conn):
+    # 主库及每个归档库的 (orders, order_items) 表名，逐个 ATTACH；给汇总表重建、对账用
+    yield "main.orders", "main.order_items"
+    for (year,) in conn.execute(select(OrderArchive.year).order_by(OrderArchive.year)).all():
+        attach(conn, [year])
+        yield f"{schema_name(year)}.orders", f"{schema_name(year)}.order_items"
+
+
+def _timestamp(value: datetime) -> str:
+    # 与 SQLAlchemy 存 DateTime 的文本格式一致，直接按字符串比较
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _move_batch(conn, year: int, start: datetime, end: datetime, batch_size: int) -> int:
+    schema = schema_name(year)
+    orders, items = ", ".join(ORDER_COLUMNS), ", ".join(ITEM_COLUMNS)
+    batch = "SELECT id FROM temp.archive_batch"
+    # 主库和归档库在同一个事务里提交（回滚日志模式下跨文件原子）
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+        conn.exec_driver_sql("DELETE FROM temp.archive_batch")
+        # 主库里 id 最大的订单和订单项不搬：INTEGER PRIMARY KEY 按现有最大值 + 1 分配，搬空后新订单会与归档撞号
+        picked = conn.exec_driver_sql(
+            "INSERT INTO temp.archive_batch (id) SELECT id FROM main.orders "
+            "WHERE status = ? AND created_at >= ? AND created_at < ? "
+            "AND id < (SELECT MAX(id) FROM main.orders) "
+            "AND id NOT IN (SELECT order_id FROM main.order_items WHERE id = (SELECT MAX(id) FROM main.order_items)) "
+            "ORDER BY created_at LIMIT ?",
+            (ARCHIVED_STATUS, _timestamp(start), _timestamp(end), batch_size),
+        ).rowcount
+        if not picked:
+            conn.rollback()
+            return 0
+        count, min_id, max_id, first, last = conn.exec_driver_sql(
+            f"SELECT COUNT(*), MIN(id), MAX(id), MIN(created_at), MAX(created_at) FROM main.orders WHERE id IN ({batch})"
+        ).one()
+        conn.exec_driver_sql(f"INSERT INTO {schema}.orders ({orders}) SELECT {orders} FROM main.orders WHERE id IN ({batch})")
+        item_count = conn.exec_driver_sql(
+            f"INSERT INTO {schema}.order_items ({items}) SELECT {items} FROM main.order_items WHERE order_id IN ({batch})"
+        ).rowcount
+        # 标记搬迁中：销售汇总的删除触发器看到这一行就跳过，汇总表保持不变
+        conn.exec_driver_sql("INSERT INTO archive_in_progress (id) VALUES (1)")
+        conn.exec_driver_sql(f"DELETE FROM main.order_items WHERE order_id IN ({batch})")
+        conn.exec_driver_sql(f"DELETE FROM main.orders WHERE id IN ({batch})")
+        conn.exec_driver_sql("DELETE FROM archive_in_progress")
+        conn.exec_driver_sql(
+            "INSERT INTO order_archives (year, path, order_count, item_count, min_id, max_id, "
+            "first_created_at, last_created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (year) DO UPDATE SET order_count = order_count + excluded.order_count, "
+            "item_count = item_count + excluded.item_count, min_id = MIN(min_id, excluded.min_id), "
+            "max_id = MAX(max_id, excluded.max_id), first_created_at = MIN(first_created_at, excluded.first_created_at), "
+            "last_created_at = MAX(last_created_at, excluded.last_created_at), updated_at = excluded.updated_at",
+            (year, archive_path(year), count, item_count, min_id, max_id, first, last, _timestamp(datetime.utcnow())),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return count
+
+
+def archive_orders(engine, before: datetime, batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> dict[int, int]:
+    # 把 before 之前的已付款订单按年份搬进归档库，返回 {年份: 搬走的订单数}；dry_run 只统计不搬
+    moved: dict[int, int] = {}
+    with engine.connect() as conn:
+        pending = conn.exec_driver_sql(
+            "SELECT CAST(strftime('%Y', created_at) AS INTEGER), COUNT(*) FROM orders "
+            "WHERE status = ? AND created_at < ? GROUP BY 1 ORDER BY 1",
+            (ARCHIVED_STATUS, _timestamp(before)),
+        ).all()
+        conn.rollback()
+        if dry_run:
+            return dict(pending)
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        for year, _ in pending:
+            attach(conn, [year])
+            for table in archive_tables(year):
+                table.create(conn, checkfirst=True)
+            conn.commit()
+            start, end = datetime(year, 1, 1), min(datetime(year + 1, 1, 1), before)
+            while True:
+                count = _move_batch(conn, year, start, end, batch_size)
+                if not count:
+                    break
+                moved[year] = moved.get(year, 0) + count
+    return moved
+
+
+def main() -> int:
+    from .database import engine
+    from .migrations import migrate
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="归档下单超过多少天的已付款订单")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="只统计各年份待归档的订单数")
+    args = parser.parse_args()
+
+    migrate(engine)
+    before = datetime.utcnow() - timedelta(days=args.days)
+    moved = archive_orders(engine, before, args.batch_size, args.dry_run)
+    for year, count in moved.items():
+        print(f"[{'DRY' if args.dry_run else 'OK'}] {year}: {count} 单 -> {archive_path(year)}")
+    if not moved:
+        print("[OK] 没有需要归档的订单")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
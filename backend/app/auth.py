@@ -1,12 +1,21 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from .database import SessionLocal
+from .database import Database, get_db
+from .profiling import timed
 from .models import User
 from .schemas import Token, UserOut
 
@@ -15,18 +24,21 @@ SECRET_KEY = "replace-this-with-a-strong-secret"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 8
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# 调整 PBKDF2_ROUNDS 后，旧参数的哈希会在用户下次登录时自动重算
+PBKDF2_ROUNDS = 29000
+# 密码哈希/校验占满 CPU 且持有 GIL，放到独立的进程池里，避免拖慢普通接口
+PASSWORD_POOL_WORKERS = 2
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PBKDF2_ROUNDS,
+    pbkdf2_sha256__min_rounds=PBKDF2_ROUNDS,
+    pbkdf2_sha256__max_rounds=PBKDF2_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -35,6 +47,46 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+_password_pool: Optional[ProcessPoolExecutor] = None
+_password_pool_lock = threading.Lock()
+
+
+def _lower_priority() -> None:
+    # CPU 紧张时让接口进程优先
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+
+def _get_password_pool() -> ProcessPoolExecutor:
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is None:
+            _password_pool = ProcessPoolExecutor(max_workers=PASSWORD_POOL_WORKERS, initializer=_lower_priority)
+        return _password_pool
+
+
+def shutdown_password_pool() -> None:
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is not None:
+            _password_pool.shutdown(cancel_futures=True)
+            _password_pool = None
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_pool(), verify_and_update_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_pool(), get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -42,7 +94,77 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+# 令牌 -> 用户缓存：命中时跳过 JWT 解码和用户查询。条目存活不超过 AUTH_CACHE_TTL 与令牌剩余有效期，
+# 用户被修改或删除时（ORM 事件）立即失效；多进程部署下其他 worker 最多滞后一个 TTL
+AUTH_CACHE_TTL = 60
+AUTH_CACHE_SIZE = 1024
+
+_auth_cache: "OrderedDict[str, tuple[float, User]]" = OrderedDict()
+_auth_cache_lock = threading.Lock()
+auth_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _cache_get(token: str) -> Optional[User]:
+    with _auth_cache_lock:
+        entry = _auth_cache.get(token)
+        if entry and entry[0] > time.monotonic():
+            _auth_cache.move_to_end(token)
+            auth_cache_stats["hits"] += 1
+            return entry[1]
+        if entry:
+            del _auth_cache[token]
+        auth_cache_stats["misses"] += 1
+        return None
+
+
+def _cache_put(token: str, user: User, token_exp: Optional[float]) -> None:
+    ttl = AUTH_CACHE_TTL
+    if token_exp is not None:
+        ttl = min(ttl, token_exp - time.time())
+    if ttl <= 0:
+        return
+    # 缓存脱离会话的副本，避免跨请求共用 ORM 实例
+    snapshot = User(id=user.id, username=user.username, display_name=user.display_name)
+    with _auth_cache_lock:
+        _auth_cache[token] = (time.monotonic() + ttl, snapshot)
+        _auth_cache.move_to_end(token)
+        while len(_auth_cache) > AUTH_CACHE_SIZE:
+            _auth_cache.popitem(last=False)
+
+
+def invalidate_user(user_id: Optional[int] = None) -> None:
+    with _auth_cache_lock:
+        if user_id is None:
+            _auth_cache.clear()
+            return
+        for token in [t for t, (_, u) in _auth_cache.items() if u.id == user_id]:
+            del _auth_cache[token]
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+async def get_current_user(database: Database = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+    with timed("auth"):
+        return await _authenticate(database, token)
+
+
+async def get_stream_user(request: Request, access_token: Optional[str] = Query(None)) -> User:
+    # 长连接（/events）用：EventSource 不能设置请求头，令牌也可以放在 ?access_token= 里；
+    # 不依赖 get_db，会话只在校验时短暂打开，不会在整个长连接期间占着数据库连接
+    token = access_token or await oauth2_scheme(request)
+    with timed("auth"):
+        async with asynccontextmanager(get_db)() as database:
+            return await _authenticate(database, token)
+
+
+async def _authenticate(database: Database, token: str) -> User:
+    cached = _cache_get(token)
+    if cached is not None:
+        return cached
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="未认证用户",
@@ -55,20 +177,32 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    user = await database.run(lambda db: db.query(User).filter(User.username == username).first())
     if user is None:
         raise credentials_exception
+    _cache_put(token, user, payload.get("exp"))
     return user
 
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 
 
+def _save_password_hash(db: Session, user: User, new_hash: str) -> None:
+    user.password_hash = new_hash
+    db.commit()
+
+
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), database: Database = Depends(get_db)):
+    user = await database.run(lambda db: db.query(User).filter(User.username == form_data.username).first())
+    if not user:
+        raise HTTPException(status_code=400, detail="用户名或密码错误")
+    with timed("auth"):
+        valid, new_hash = await verify_password_async(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=400, detail="用户名或密码错误")
+    if new_hash:
+        await database.run(_save_password_hash, user, new_hash)
     access_token = create_access_token({"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -76,3 +210,9 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 @router.get("/me", response_model=UserOut)
 def me(current_user: User = Depends(get_current_user)):
     return UserOut(id=current_user.id, username=current_user.username, display_name=current_user.display_name)
+
+
+@router.get("/cache-stats")
+def cache_stats(current_user: User = Depends(get_current_user)):
+    with _auth_cache_lock:
+        return {**auth_cache_stats, "size": len(_auth_cache)}
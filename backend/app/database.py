@@ -1,7 +1,15 @@
+import os
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 DATABASE_URL = "sqlite:///jinxiaocun.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///jinxiaocun.db"
+
+# "async"：接口走 AsyncSession（aiosqlite），不占线程池；"sync"：沿用同步会话，放进线程池执行
+DB_MODE = os.getenv("JXC_DB_MODE", "async")
 
 engine = create_engine(
     DATABASE_URL,
@@ -11,3 +19,32 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL) if DB_MODE == "async" else None
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if async_engine is not None else None
+)
+
+
+class Database:
+    # 接口里的数据库句柄：业务代码写成接收同步 Session 的函数，交给 run() 执行。
+    # async 模式下通过 AsyncSession.run_sync 在事件循环上执行（IO 由 aiosqlite 异步完成），
+    # sync 模式下放进线程池，与原先的同步接口等价
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield Database(session)
+    else:
+        db = SessionLocal()
+        try:
+            yield Database(db)
+        finally:
+            db.close()
@@ -0,0 +1,235 @@
+import asyncio
+import signal
+import threading
+import time
+from collections import deque
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .auth import get_stream_user
+from .serialization import dumps
+from .versions import table_versions
+
+
+# 变更推送：写接口在提交前用 stage() 登记变更（实体、id、操作、变化的字段），提交成功后由会话事件统一发布到进程内的 hub，
+# 回滚则丢弃；GET /events 以 SSE 推给订阅者。version 为该实体的表版本号（与列表接口 ETag 里的一致）。
+# 每个进程一个 hub：多 worker 部署时只能收到同一 worker 上的写入。
+# 断线后浏览器带 Last-Event-ID 自动重连，最近 EVENT_HISTORY 条之内的从缓存补发，否则先发一条 reset 让前端整页重拉
+EVENT_HISTORY = 2000
+# 单个订阅者积压超过这么多条就断开，让它重连后从缓存补发，慢客户端拖不住发布方
+SUBSCRIBER_BACKLOG = 500
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 2000
+ENTITIES = ("products", "customers", "orders")
+
+
+class Subscriber:
+    def __init__(self, entities: frozenset[str], start_seq: int):
+        self.entities = entities
+        # 订阅时已发布到的序号；之前的事件要么已补发，要么与本次订阅无关
+        self.start_seq = start_seq
+        self.pending: deque[bytes] = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+
+    def push(self, items: list[tuple[int, str, bytes]]) -> None:
+        for seq, entity, frame in items:
+            if seq > self.start_seq and entity in self.entities:
+                self.pending.append(frame)
+        if len(self.pending) > SUBSCRIBER_BACKLOG:
+            self.pending.clear()
+            self.closed = True
+        if self.pending or self.closed:
+            self.wakeup.set()
+
+
+class ChangeHub:
+    def __init__(self):
+        # 事件 id 为 "<进程启动时刻>-<序号>"：服务重启后旧 id 对不上，客户端会收到 reset 而不是漏掉变更
+        self.epoch = format(time.time_ns() // 1_000_000, "x")
+        self.seq = 0
+        self.history: deque[tuple[int, str, bytes]] = deque(maxlen=EVENT_HISTORY)
+        self.subscribers: set[Subscriber] = set()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def publish(self, changes: list[dict]) -> None:
+        # 可以在事件循环上调用（async 会话），也可以在线程池里调用（sync 会话、导入）；帧只编码一次，所有订阅者共用
+        with self.lock:
+            items = []
+            for change in changes:
+                self.seq += 1
+                frame = f"id: {self.event_id(self.seq)}\ndata: ".encode() + dumps(change) + b"\n\n"
+                items.append((self.seq, change["entity"], frame))
+            self.history.extend(items)
+            loop = self.loop
+        if loop is None or not self.subscribers:
+            return
+        if _running_loop() is loop:
+            self._deliver(items)
+        else:
+            loop.call_soon_threadsafe(self._deliver, items)
+
+    def _deliver(self, items) -> None:
+        for subscriber in list(self.subscribers):
+            subscriber.push(items)
+
+    def _resume_point(self, last_event_id: str) -> int | None:
+        # 能续传时返回客户端已收到的序号，否则 None
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        oldest = self.history[0][0] if self.history else self.seq + 1
+        return int(seq) if int(seq) >= oldest - 1 else None
+
+    def subscribe(self, entities: frozenset[str], last_event_id: str | None) -> tuple[Subscriber, list[bytes] | None]:
+        # 返回 (订阅者, 需要补发的帧)；补发的帧为 None 表示断点已不在缓存里，需要整页重拉
+        with self.lock:
+            self.loop = asyncio.get_running_loop()
+            replay: list[bytes] | None = []
+            if last_event_id:
+                start = self._resume_point(last_event_id)
+                if start is None:
+                    replay = None
+                else:
+                    replay = [frame for seq, entity, frame in self.history if seq > start and entity in entities]
+            subscriber = Subscriber(entities, self.seq)
+            self.subscribers.add(subscriber)
+        return subscriber, replay
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def close(self) -> None:
+        # 服务关停：结束所有推送流（可以在信号处理函数里调用）
+        self.closed = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._close_all)
+
+    def _close_all(self) -> None:
+        for subscriber in list(self.subscribers):
+            subscriber.closed = True
+            subscriber.wakeup.set()
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+hub = ChangeHub()
+
+
+def stage(db: Session, entity: str, entity_id: int | None, op: str, **fields) -> None:
+    # 登记一条变更，随本次提交一起发布。op: create / update / delete，批量写入用 bulk（entity_id 为 None，前端整页重拉）
+    db.info.setdefault("staged_changes", []).append((entity, entity_id, op, fields))
+
+
+@event.listens_for(Session, "before_commit")
+def _stamp_changes(session: Session) -> None:
+    staged = session.info.pop("staged_changes", None)
+    if not staged:
+        return
+    # 先把待写入的改动落库，再在同一事务里读表版本，版本号与这次写入严格对应
+    session.flush()
+    versions = table_versions(session, tuple({entity for entity, _, _, _ in staged}))
+    changes = []
+    for entity, entity_id, op, fields in staged:
+        change = {"entity": entity, "op": op, "id": entity_id, "version": versions.get(entity)}
+        if fields:
+            change["fields"] = fields
+        changes.append(change)
+    session.info["commit_changes"] = changes
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session: Session) -> None:
+    changes = session.info.pop("commit_changes", None)
+    if changes:
+        hub.publish(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_changes(session: Session) -> None:
+    session.info.pop("staged_changes", None)
+    session.info.pop("commit_changes", None)
+
+
+def close_on_exit_signals() -> None:
+    # uvicorn 关停时要等所有连接结束，而推送流不会自己结束：收到退出信号先关掉推送流，再交给原来的处理函数
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            hub.close()
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+def _parse_entities(value: str | None) -> frozenset[str]:
+    if not value:
+        return frozenset(ENTITIES)
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(ENTITIES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知实体: {', '.join(sorted(unknown))}")
+    return frozenset(names or ENTITIES)
+
+
+async def _stream(entities: frozenset[str], last_event_id: str | None):
+    subscriber, replay = hub.subscribe(entities, last_event_id)
+    try:
+        head = [f"retry: {RETRY_MS}\n\n".encode()]
+        if replay is None:
+            head.append(b"event: reset\ndata: {}\n\n")
+        else:
+            head.extend(replay)
+        # 只有 id 没有 data 的帧不触发事件，但会更新浏览器记下的 Last-Event-ID
+        head.append(f"id: {hub.event_id(subscriber.start_seq)}\n\n".encode())
+        yield b"".join(head)
+        while not subscriber.closed and not hub.closed:
+            if not subscriber.pending:
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                subscriber.wakeup.clear()
+                continue
+            frames = b"".join(subscriber.pending)
+            subscriber.pending.clear()
+            yield frames
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+router = APIRouter(tags=["变更推送"])
+
+
+@router.get("/events")
+async def events(
+    request: Request,
+    entities: str | None = Query(None, description="逗号分隔：products,customers,orders；不传为全部"),
+    last_event_id: str | None = Query(None, description="首次连接时从这个事件之后续传；重连时浏览器会带 Last-Event-ID 头"),
+    user=Depends(get_stream_user),
+):
+    wanted = _parse_entities(entities)
+    return StreamingResponse(
+        _stream(wanted, request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
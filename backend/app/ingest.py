@@ -0,0 +1,335 @@
+import codecs
+import csv
+import io
+import json
+from collections import defaultdict
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .events import stage
+from .inventory import REASON_IMPORT, REASON_ORDER, UNTRACKED_UNITS, record_movements, record_stock_set
+from .models import Order, OrderItem, Product, Customer
+from .schemas import OrderCreate, OrderItemCreate, ProductCreate
+
+
+# 库存被并发改动时重新分配的次数上限
+ALLOCATE_ATTEMPTS = 3
+
+# 订单项允许的单位
+UNITS = ("件", "斤")
+
+
+def check_line(price: float, unit: str | None) -> str:
+    # 校验单价与单位，返回规范化后的单位
+    if price < 0:
+        raise HTTPException(status_code=400, detail=f"单价不合法: {price}")
+    unit = unit or "件"
+    if unit not in UNITS:
+        raise HTTPException(status_code=400, detail=f"单位不合法: {unit}")
+    return unit
+
+
+def line_values(product, item: OrderItemCreate) -> dict:
+    price = item.unit_price if item.unit_price is not None else product.price
+    unit = check_line(price, item.unit)
+    return {
+        "product_id": product.id,
+        "product_name": product.name,
+        "unit_price": price,
+        "quantity": item.quantity,
+        "unit": unit,
+        "subtotal": price * item.quantity,
+    }
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors())
+
+
+# 逐条解析请求体：首个非空字符为 "[" 时按 JSON 数组解析，否则按 NDJSON（每行一个对象）。
+# 产出 (index, OrderCreate | None, error | None)
+async def iter_order_payloads(stream):
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer, mode, index = "", None, 0
+
+    def parsed(obj):
+        nonlocal index
+        index += 1
+        if not isinstance(obj, dict):
+            return index - 1, None, "每个订单必须是 JSON 对象"
+        try:
+            return index - 1, OrderCreate.model_validate(obj), None
+        except ValidationError as exc:
+            return index - 1, None, _validation_message(exc)
+
+    async for chunk in stream:
+        buffer += text.decode(chunk)
+        if mode is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            buffer = stripped[1:] if mode == "array" else stripped
+        if mode == "ndjson":
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        yield parsed(json.loads(line))
+                    except json.JSONDecodeError as exc:
+                        index += 1
+                        yield index - 1, None, f"JSON 格式错误: {exc.msg}"
+        else:
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,]":
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                try:
+                    obj, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break
+                yield parsed(obj)
+            buffer = buffer[pos:]
+
+    buffer += text.decode(b"", final=True)
+    if mode == "ndjson" and buffer.strip():
+        try:
+            yield parsed(json.loads(buffer))
+        except json.JSONDecodeError as exc:
+            yield index, None, f"JSON 格式错误: {exc.msg}"
+    elif mode == "array" and buffer.strip(" \t\r\n,]"):
+        yield index, None, "JSON 格式错误: 数组未正常结束"
+
+
+def _allocate(db: Session, prepared: list, products: dict, results: dict) -> list:
+    tracked_ids = {line["product_id"] for _, _, lines in prepared for line in lines if line["unit"] not in UNTRACKED_UNITS}
+    for _ in range(ALLOCATE_ATTEMPTS):
+        stock = dict(db.query(Product.id, Product.stock).filter(Product.id.in_(tracked_ids)).all()) if tracked_ids else {}
+        accepted, need = [], defaultdict(float)
+        for entry in prepared:
+            index, _, lines = entry
+            want = defaultdict(float)
+            for line in lines:
+                if line["unit"] not in UNTRACKED_UNITS:
+                    want[line["product_id"]] += line["quantity"]
+            short = [pid for pid, q in want.items() if stock.get(pid, 0) - need[pid] < q]
+            if short:
+                names = "、".join(f"{products[pid].name} (剩余 {stock.get(pid, 0) - need[pid]})" for pid in short)
+                results[index] = {"index": index, "ok": False, "error": f"库存不足: {names}"}
+                continue
+            for pid, q in want.items():
+                need[pid] += q
+            accepted.append(entry)
+
+        # 条件 UPDATE 兜底：期间若有其他请求扣了库存则回滚重新分配
+        raced = False
+        for pid, q in need.items():
+            result = db.execute(
+                update(Product)
+                .where(Product.id == pid, Product.stock >= q)
+                .values(stock=Product.stock - q)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                raced = True
+                break
+        if not raced:
+            return accepted
+        db.rollback()
+        for index, _, _ in prepared:
+            results.pop(index, None)
+    for index, _, _ in prepared:
+        results[index] = {"index": index, "ok": False, "error": "库存变动频繁，请重试"}
+    return []
+
+
+# 批量写入一批订单并提交，返回按 index 排序的逐单结果
+def ingest_chunk(db: Session, chunk: list[tuple[int, OrderCreate]]) -> list[dict]:
+    results: dict[int, dict] = {}
+    product_ids = {item.product_id for _, payload in chunk for item in payload.items}
+    products = {
+        row.id: row
+        for row in db.query(Product.id, Product.name, Product.price).filter(Product.id.in_(product_ids)).all()
+    } if product_ids else {}
+    customer_ids = {payload.customer_id for _, payload in chunk if payload.customer_id}
+    customers = {
+        row.id: row
+        for row in db.query(Customer.id, Customer.name, Customer.phone, Customer.address)
+        .filter(Customer.id.in_(customer_ids)).all()
+    } if customer_ids else {}
+
+    prepared = []
+    for index, payload in chunk:
+        try:
+            if not payload.items:
+                raise HTTPException(status_code=400, detail="订单至少包含一个商品")
+            lines = []
+            for item in payload.items:
+                product = products.get(item.product_id)
+                if not product:
+                    raise HTTPException(status_code=404, detail=f"商品不存在: {item.product_id}")
+                lines.append(line_values(product, item))
+            prepared.append((index, payload, lines))
+        except HTTPException as exc:
+            results[index] = {"index": index, "ok": False, "error": exc.detail}
+
+    accepted = _allocate(db, prepared, products, results)
+    if accepted:
+        # 未选客户的订单与单笔接口一致，各建一个临时客户
+        walk_ins = [payload for _, payload, _ in accepted if not payload.customer_id]
+        temp_ids = iter(db.scalars(
+            insert(Customer).returning(Customer.id, sort_by_parameter_order=True),
+            [
+                {"name": p.customer_name or "散客", "phone": p.customer_phone or None, "address": p.customer_address or None}
+                for p in walk_ins
+            ],
+        ).all() if walk_ins else [])
+
+        order_rows = []
+        for _, payload, lines in accepted:
+            row = {
+                "customer_id": payload.customer_id,
+                "customer_name": payload.customer_name,
+                "customer_phone": payload.customer_phone,
+                "customer_address": payload.customer_address,
+                "total_amount": sum(line["subtotal"] for line in lines),
+                "status": "未付款",
+            }
+            if payload.customer_id:
+                customer = customers.get(payload.customer_id)
+                if customer:
+                    row["customer_name"] = row["customer_name"] or customer.name
+                    row["customer_phone"] = row["customer_phone"] or customer.phone
+                    row["customer_address"] = row["customer_address"] or customer.address
+            else:
+                row["customer_id"] = next(temp_ids)
+                row["customer_name"] = payload.customer_name or "散客"
+                row["customer_phone"] = payload.customer_phone or None
+                row["customer_address"] = payload.customer_address or None
+            order_rows.append(row)
+
+        order_ids = db.scalars(insert(Order).returning(Order.id, sort_by_parameter_order=True), order_rows).all()
+        db.execute(insert(OrderItem), [
+            {**line, "order_id": order_id}
+            for order_id, (_, _, lines) in zip(order_ids, accepted)
+            for line in lines
+        ])
+        movements = []
+        for order_id, (_, _, lines) in zip(order_ids, accepted):
+            taken = defaultdict(float)
+            for line in lines:
+                if line["unit"] not in UNTRACKED_UNITS:
+                    taken[line["product_id"]] -= line["quantity"]
+            movements.extend((pid, delta, order_id) for pid, delta in taken.items())
+        record_movements(db, movements, REASON_ORDER)
+        for order_id, (index, _, _), row in zip(order_ids, accepted, order_rows):
+            results[index] = {"index": index, "ok": True, "id": order_id, "total_amount": row["total_amount"]}
+        # 批量写入只推一条汇总变更，前端整页重拉
+        stage(db, "orders", None, "bulk", count=len(order_ids))
+        touched = {pid for pid, _, _ in movements}
+        if touched:
+            stage(db, "products", None, "bulk", count=len(touched))
+        if walk_ins:
+            stage(db, "customers", None, "bulk", count=len(walk_ins))
+    db.commit()
+    return [results[index] for index in sorted(results)]
+
+
+# 商品导入的表头：既认字段名，也认 /products/export 导出的中文表头，导出的文件可直接改完导回
+PRODUCT_IMPORT_COLUMNS = {
+    "name": "name", "名称": "name",
+    "sku": "sku", "SKU": "sku",
+    "price": "price", "单价": "price",
+    "stock": "stock", "库存": "stock",
+    "description": "description", "描述": "description",
+    "original_weight": "original_weight", "原重": "original_weight",
+}
+PRODUCT_IMPORT_REQUIRED = ("name", "sku", "price", "stock")
+
+
+def _upsert_products(db: Session, rows: list[dict], update_fields: list[str]) -> None:
+    stmt = sqlite_insert(Product.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Product.__table__.c.sku],
+        set_={field: stmt.excluded[field] for field in update_fields},
+    )
+    db.execute(stmt, rows)
+
+
+# 逐行解析 CSV 并按 SKU 批量 upsert；表中没有的列在更新已有商品时保持原值
+def import_products(db: Session, file, dry_run: bool = False, batch_size: int = 500) -> dict:
+    reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    try:
+        header = next(reader, None)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="文件需为 UTF-8 编码的 CSV")
+    if not header:
+        raise HTTPException(status_code=400, detail="文件为空")
+    columns = [PRODUCT_IMPORT_COLUMNS.get(h.strip()) for h in header]
+    missing = [c for c in PRODUCT_IMPORT_REQUIRED if c not in columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"缺少列: {', '.join(missing)}")
+    update_fields = [c for c in dict.fromkeys(columns) if c and c != "sku"]
+
+    report = {"dry_run": dry_run, "total": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    seen: dict[str, int] = {}
+    batch: list[dict] = []
+
+    def fail(row_no, sku, error):
+        report["failed"] += 1
+        report["errors"].append({"row": row_no, "sku": sku, "error": error})
+
+    def flush():
+        skus = [row["sku"] for row in batch]
+        existing = set(db.scalars(select(Product.sku).where(Product.sku.in_(skus))).all())
+        report["updated"] += len(existing)
+        report["inserted"] += len(batch) - len(existing)
+        if not dry_run:
+            # 已有商品先按新旧库存差记流水，新商品在 upsert 之后按导入库存记
+            record_stock_set(db, [row for row in batch if row["sku"] in existing], REASON_IMPORT, key="sku")
+            _upsert_products(db, batch, update_fields)
+            new_skus = [row["sku"] for row in batch if row["sku"] not in existing]
+            if new_skus:
+                created = db.query(Product.id, Product.stock).filter(Product.sku.in_(new_skus)).all()
+                record_movements(db, [(pid, stock, None) for pid, stock in created], REASON_IMPORT)
+            stage(db, "products", None, "bulk", count=len(batch))
+            db.commit()
+        batch.clear()
+
+    try:
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            row_no = reader.line_num
+            report["total"] += 1
+            data = {c: v.strip() for c, v in zip(columns, values) if c and v.strip()}
+            sku = data.get("sku")
+            try:
+                product = ProductCreate.model_validate(data)
+            except ValidationError as exc:
+                fail(row_no, sku, _validation_message(exc))
+                continue
+            if not product.sku or product.sku == "无":
+                fail(row_no, sku, "缺少 SKU，无法按 SKU 导入")
+                continue
+            if product.sku in seen:
+                fail(row_no, sku, f"SKU 与第 {seen[product.sku]} 行重复")
+                continue
+            seen[product.sku] = row_no
+            row = product.model_dump()
+            row["original_weight"] = row["original_weight"] or "无"
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="文件需为 UTF-8 编码的 CSV")
+    if batch:
+        flush()
+    return report
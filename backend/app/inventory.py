@@ -0,0 +1,268 @@
+import argparse
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, text, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .events import stage
+from .models import InventoryMovement, InventorySnapshot, Product
+
+
+# 按斤卖的商品不记库存
+UNTRACKED_UNITS = ("斤",)
+
+# 库存流水的变动原因
+REASON_OPENING = "期初"
+REASON_CREATE = "新建"
+REASON_ADJUST = "调整"
+REASON_IMPORT = "导入"
+REASON_ORDER = "下单"
+REASON_EDIT = "改单"
+REASON_ADD_ITEM = "加项"
+REASON_DELETE_ITEM = "删项"
+REASON_RECONCILE = "对账"
+
+# 快照间隔：距上次快照不足这么久时定时任务跳过；服务内的定时任务每 SNAPSHOT_CHECK_SECONDS 检查一次
+SNAPSHOT_INTERVAL = timedelta(hours=6)
+SNAPSHOT_CHECK_SECONDS = 600
+
+# 对账时的浮点误差容忍
+RECONCILE_TOLERANCE = 1e-6
+
+
+# 一次订单改动的库存变更：商品用一条 IN 查询取回，数量按商品轧差，
+# 每个净扣减都是带 stock >= :q 条件的 UPDATE，并发下也不会超卖；所有不足的商品一次性报出
+class StockReservation:
+    def __init__(self, db: Session):
+        self.db = db
+        self.products: dict[int, Product] = {}
+        self.deltas: dict[int, float] = defaultdict(float)
+        self.applied: dict[int, float] = {}
+
+    def load(self, product_ids) -> dict[int, Product]:
+        missing = {pid for pid in product_ids if pid not in self.products}
+        if missing:
+            for product in self.db.query(Product).filter(Product.id.in_(missing)).all():
+                self.products[product.id] = product
+        return self.products
+
+    def product(self, product_id: int) -> Product:
+        if product_id not in self.products:
+            self.load([product_id])
+        product = self.products.get(product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail=f"商品不存在: {product_id}")
+        return product
+
+    def take(self, product_id: int, quantity: float, unit: str | None) -> None:
+        if unit not in UNTRACKED_UNITS:
+            self.deltas[product_id] -= quantity
+
+    def give_back(self, product_id: int, quantity: float, unit: str | None) -> None:
+        if unit not in UNTRACKED_UNITS:
+            self.deltas[product_id] += quantity
+
+    def apply(self) -> None:
+        shortfalls = []
+        for product_id, delta in self.deltas.items():
+            if delta == 0:
+                continue
+            stmt = update(Product).where(Product.id == product_id)
+            if delta < 0:
+                stmt = stmt.where(Product.stock >= -delta)
+            stock = self.db.execute(
+                stmt.values(stock=Product.stock + delta)
+                .returning(Product.stock)
+                .execution_options(synchronize_session=False)
+            ).scalar_one_or_none()
+            if delta < 0 and stock is None:
+                shortfalls.append(product_id)
+            elif stock is not None:
+                self.applied[product_id] = self.applied.get(product_id, 0.0) + delta
+                # RETURNING 取回的是存储值，整数值的 REAL 会以 int 返回
+                stage(self.db, "products", product_id, "update", stock=float(stock))
+        self.deltas.clear()
+        if shortfalls:
+            names = {pid: self.products[pid].name if pid in self.products else str(pid) for pid in shortfalls}
+            self.db.rollback()
+            self.applied.clear()
+            stocks = dict(self.db.query(Product.id, Product.stock).filter(Product.id.in_(shortfalls)).all())
+            detail = "、".join(f"{names[pid]} (剩余 {stocks.get(pid, 0)})" for pid in shortfalls)
+            raise HTTPException(status_code=400, detail=f"库存不足: {detail}")
+
+    def record(self, reason: str, order_id: int | None = None) -> None:
+        # 已生效的变动写入库存流水，与库存更新同一事务提交；新建订单在 flush 拿到 id 后再调用
+        record_movements(self.db, [(pid, delta, order_id) for pid, delta in self.applied.items()], reason)
+        self.applied.clear()
+
+
+def record_movements(db: Session, movements: list[tuple[int, float, int | None]], reason: str) -> None:
+    # movements: [(product_id, delta, order_id)]，一次 executemany 批量写入
+    rows = [
+        {"product_id": pid, "delta": delta, "reason": reason, "order_id": order_id}
+        for pid, delta, order_id in movements
+        if delta
+    ]
+    if rows:
+        db.execute(insert(InventoryMovement), rows)
+
+
+def record_stock_set(db: Session, rows: list[dict], reason: str, key: str = "id") -> None:
+    # 库存被直接改成新值（编辑商品、导入）之前调用：按 rows 里的 {key, stock} 记下 新值 - 当前值。
+    # 整批一条 INSERT ... SELECT（json_each 展开），它会拿到写锁，之后同一事务里的 UPDATE 之前不会有别的写入插进来
+    if not rows:
+        return
+    column = "id" if key == "id" else "sku"
+    db.execute(
+        text(
+            "INSERT INTO inventory_movements (product_id, delta, reason, created_at) "
+            "SELECT p.id, json_extract(v.value, '$[1]') - p.stock, :reason, :now "
+            f"FROM json_each(:rows) AS v JOIN products AS p ON p.{column} = json_extract(v.value, '$[0]') "
+            "WHERE p.stock != json_extract(v.value, '$[1]')"
+        ),
+        {"rows": json.dumps([[row[key], row["stock"]] for row in rows]), "reason": reason, "now": datetime.utcnow()},
+    )
+
+
+def ensure_opening_balances(db: Session) -> int:
+    # 流水为空（新库或老库升级）时，按当前库存给每个商品记一笔期初；由调用方提交
+    if db.query(InventoryMovement.id).first() is not None:
+        return 0
+    products = db.query(Product.id, Product.stock).filter(Product.stock != 0).all()
+    record_movements(db, [(pid, stock, None) for pid, stock in products], REASON_OPENING)
+    return len(products)
+
+
+def _latest_snapshots(db: Session, product_ids=None) -> dict[int, tuple[int, float]]:
+    # product_id -> (movement_id, stock)，取每个商品最新的一次快照
+    latest = db.query(func.max(InventorySnapshot.id)).group_by(InventorySnapshot.product_id)
+    if product_ids is not None:
+        latest = latest.filter(InventorySnapshot.product_id.in_(product_ids))
+    rows = db.query(InventorySnapshot.product_id, InventorySnapshot.movement_id, InventorySnapshot.stock).filter(
+        InventorySnapshot.id.in_(latest.scalar_subquery())
+    )
+    return {pid: (movement_id, stock) for pid, movement_id, stock in rows}
+
+
+def take_snapshots(db: Session, force: bool = False) -> int:
+    # 以当前最大流水号为截点，给截点之后有变动的商品各记一行快照：上次快照 + 这段流水的合计。
+    # 只扫描上次截点之后的流水；返回新增的快照行数
+    now = datetime.utcnow()
+    last_taken = db.query(func.max(InventorySnapshot.taken_at)).scalar()
+    if not force and last_taken is not None and now - last_taken < SNAPSHOT_INTERVAL:
+        return 0
+    cut = db.query(func.max(InventoryMovement.id)).scalar()
+    if cut is None:
+        return 0
+    previous_cut = db.query(func.coalesce(func.max(InventorySnapshot.movement_id), 0)).scalar()
+    changed = dict(
+        db.query(InventoryMovement.product_id, func.sum(InventoryMovement.delta))
+        .filter(InventoryMovement.id > previous_cut, InventoryMovement.id <= cut)
+        .group_by(InventoryMovement.product_id)
+        .all()
+    )
+    if not changed:
+        return 0
+    base = _latest_snapshots(db, list(changed))
+    db.execute(insert(InventorySnapshot), [
+        {"product_id": pid, "movement_id": cut, "stock": base.get(pid, (0, 0.0))[1] + delta, "taken_at": now}
+        for pid, delta in changed.items()
+    ])
+    db.commit()
+    return len(changed)
+
+
+def run_snapshot_job() -> int:
+    # 多个 worker 各自定时检查，SNAPSHOT_INTERVAL 保证同一时段只有一个真正截快照
+    db = SessionLocal()
+    try:
+        return take_snapshots(db)
+    finally:
+        db.close()
+
+
+def stock_at(db: Session, product_id: int, at: datetime) -> dict:
+    # 某一时刻的库存：at 之前最近的一次快照 + 该快照截点之后、at 之前的流水（按 (product_id, id) 索引范围扫描）
+    snapshot = (
+        db.query(InventorySnapshot.movement_id, InventorySnapshot.stock, InventorySnapshot.taken_at)
+        .filter(InventorySnapshot.product_id == product_id, InventorySnapshot.taken_at <= at)
+        .order_by(InventorySnapshot.taken_at.desc(), InventorySnapshot.id.desc())
+        .first()
+    )
+    movement_id, stock, taken_at = snapshot if snapshot else (0, 0.0, None)
+    delta, count = db.query(func.coalesce(func.sum(InventoryMovement.delta), 0.0), func.count(InventoryMovement.id)).filter(
+        InventoryMovement.product_id == product_id,
+        InventoryMovement.id > movement_id,
+        InventoryMovement.created_at <= at,
+    ).one()
+    return {
+        "product_id": product_id,
+        "at": at,
+        "stock": stock + delta,
+        "snapshot_at": taken_at,
+        "movements_scanned": count,
+    }
+
+
+def reconcile(db: Session, fix: bool = False) -> list[dict]:
+    # 流水合计（最新快照 + 之后的流水）与 Product.stock 逐个核对；fix 时补记一笔对账调整
+    snapshots = _latest_snapshots(db)
+    latest = (
+        db.query(InventorySnapshot.product_id, InventorySnapshot.movement_id)
+        .filter(InventorySnapshot.id.in_(
+            db.query(func.max(InventorySnapshot.id)).group_by(InventorySnapshot.product_id).scalar_subquery()
+        ))
+        .subquery()
+    )
+    since = dict(
+        db.query(InventoryMovement.product_id, func.sum(InventoryMovement.delta))
+        .outerjoin(latest, latest.c.product_id == InventoryMovement.product_id)
+        .filter(InventoryMovement.id > func.coalesce(latest.c.movement_id, 0))
+        .group_by(InventoryMovement.product_id)
+        .all()
+    )
+    mismatches = []
+    for pid, name, stock in db.query(Product.id, Product.name, Product.stock).order_by(Product.id):
+        ledger = snapshots.get(pid, (0, 0.0))[1] + since.get(pid, 0.0)
+        if abs(ledger - stock) > RECONCILE_TOLERANCE:
+            mismatches.append({"product_id": pid, "name": name, "stock": stock, "ledger": ledger})
+    if fix and mismatches:
+        record_movements(db, [(m["product_id"], m["stock"] - m["ledger"], None) for m in mismatches], REASON_RECONCILE)
+        db.commit()
+    return mismatches
+
+
+# 定时快照与对账：
+#   cd backend && python -m app.inventory snapshot [--force]
+#   cd backend && python -m app.inventory reconcile [--fix]    # 有差异时返回 1
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=("snapshot", "reconcile"))
+    parser.add_argument("--force", action="store_true", help="不管距上次快照多久都重新截一次")
+    parser.add_argument("--fix", action="store_true", help="按 Product.stock 补记对账调整")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "snapshot":
+            print(f"[OK] 新增快照 {take_snapshots(db, force=args.force)} 行")
+            return 0
+        mismatches = reconcile(db, fix=args.fix)
+        for m in mismatches:
+            print(f"[DIFF] #{m['product_id']} {m['name']}: 库存 {m['stock']} / 流水 {m['ledger']}")
+        if not mismatches:
+            print("[OK] 库存与流水一致")
+        elif args.fix:
+            print(f"[OK] 已补记 {len(mismatches)} 笔对账调整")
+        return 1 if mismatches and not args.fix else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
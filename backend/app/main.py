@@ -1,23 +1,27 @@
-from fastapi import FastAPI, Depends
+import asyncio
+import logging
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
 
-from .database import Base, engine, SessionLocal
-from .models import User, Product, Customer
-from .auth import router as auth_router, get_password_hash
+from .database import engine, async_engine
+from .auth import router as auth_router, shutdown_password_pool
+from .migrations import migrate
+from .profiling import PROFILING, setup as setup_profiling
+from .events import close_on_exit_signals, router as events_router
+from .sync import router as sync_router
+from .inventory import SNAPSHOT_CHECK_SECONDS, run_snapshot_job
 from .routers import products as products_router
 from .routers import customers as customers_router
 from .routers import orders as orders_router
+from .routers import stats as stats_router
+from .routers import reports as reports_router
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+logger = logging.getLogger(__name__)
 
 
 app = FastAPI(title="进销存系统 API", version="0.1.0")
@@ -30,64 +34,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if PROFILING:
+    setup_profiling(app, [engine] + ([async_engine.sync_engine] if async_engine is not None else []))
+
+
+@app.on_event("startup")
+def run_migrations():
+    # 已是最新版本时只查一次 schema_version
+    migrate(engine)
+
+
+@app.on_event("startup")
+def install_signal_handlers():
+    close_on_exit_signals()
+
 
-Base.metadata.create_all(bind=engine)
+async def _snapshot_loop():
+    while True:
+        try:
+            await run_in_threadpool(run_snapshot_job)
+        except Exception:
+            logger.exception("库存快照失败")
+        await asyncio.sleep(SNAPSHOT_CHECK_SECONDS)
 
 
 @app.on_event("startup")
-def seed_data():
-    db = SessionLocal()
-    try:
-        # migrate: add unit column to order_items if missing
-        with engine.connect() as conn:
-            res = conn.exec_driver_sql("PRAGMA table_info(order_items)").fetchall()
-            cols = {row[1] for row in res}
-            if "unit" not in cols:
-                conn.exec_driver_sql("ALTER TABLE order_items ADD COLUMN unit VARCHAR(10) DEFAULT '件' NOT NULL")
-            # migrate: add status column to orders if missing
-            res_orders = conn.exec_driver_sql("PRAGMA table_info(orders)").fetchall()
-            cols_orders = {row[1] for row in res_orders}
-            if "status" not in cols_orders:
-                conn.exec_driver_sql("ALTER TABLE orders ADD COLUMN status VARCHAR(20) DEFAULT '未付款' NOT NULL")
-            
-            # migrate: add original_weight to products
-            res_products = conn.exec_driver_sql("PRAGMA table_info(products)").fetchall()
-            cols_products = {row[1] for row in res_products}
-            if "original_weight" not in cols_products:
-                conn.exec_driver_sql("ALTER TABLE products ADD COLUMN original_weight TEXT DEFAULT '无'")
-            
-            # update defaults
-            try:
-                conn.exec_driver_sql("UPDATE products SET sku = '无' WHERE sku IS NULL OR sku = ''")
-            except Exception:
-                pass
-            try:
-                conn.exec_driver_sql("UPDATE customers SET phone = '无' WHERE phone IS NULL OR phone = ''")
-            except Exception:
-                pass
-            
-        # seed admin user
-        if not db.query(User).filter(User.username == "admin").first():
-            db.add(User(username="admin", password_hash=get_password_hash("admin"), display_name="管理员"))
-        # seed some products
-        if db.query(Product).count() == 0:
-            db.add_all([
-                Product(name="苹果", sku="APL-001", price=5.5, stock=100, description="新鲜苹果"),
-                Product(name="香蕉", sku="BAN-001", price=4.2, stock=80, description="进口香蕉"),
-                Product(name="牛奶", sku="MLK-001", price=6.8, stock=60, description="纯牛奶"),
-            ])
-        # seed a customer
-        if db.query(Customer).count() == 0:
-            db.add(Customer(name="张三", phone="13800000000", address="北京市海淀区"))
-        db.commit()
-    finally:
-        db.close()
+async def start_snapshot_task():
+    app.state.snapshot_task = asyncio.create_task(_snapshot_loop())
+
+
+@app.on_event("shutdown")
+async def stop_snapshot_task():
+    task = getattr(app.state, "snapshot_task", None)
+    if task is not None:
+        task.cancel()
+
+
+@app.on_event("shutdown")
+def stop_password_pool():
+    shutdown_password_pool()
+
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
 
 
 app.include_router(auth_router)
 app.include_router(products_router.router)
 app.include_router(customers_router.router)
 app.include_router(orders_router.router)
+app.include_router(stats_router.router)
+app.include_router(reports_router.router)
+app.include_router(events_router)
+app.include_router(sync_router)
 
 
 @app.get("/", tags=["健康检查"])
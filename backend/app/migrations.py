@@ -0,0 +1,242 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .database import Base
+from .models import Customer, OrderArchive, Product, User
+from .auth import get_password_hash
+from .search import ensure_fts_tables
+from .versions import ensure_version_table
+from .reports import ensure_report_tables
+from .inventory import ensure_opening_balances
+from .sync import SYNC_TABLES, ensure_sync_tables
+
+
+# 数据库结构迁移：按编号顺序各执行一次，执行过的编号记在 schema_version 表里。
+# 启动时只查一次当前版本，已是最新就直接返回，不再逐表探测结构、也不再每次全表 UPDATE。
+# 每个迁移与它在 schema_version 里的记录在同一个 BEGIN IMMEDIATE 事务里提交：多个 worker 同时启动时
+# 只有拿到写锁的那个执行，其余等锁释放后重新读版本号，发现已执行就跳过。
+# 升级前的老库没有 schema_version，会把全部迁移跑一遍，所以迁移都要能在已有结构上安全执行。
+# 新增迁移时在 MIGRATIONS 末尾追加，编号递增；已发布的迁移不要再改。
+#   cd backend && python -m app.migrations            # 执行待执行的迁移
+#   cd backend && python -m app.migrations --status   # 只列出各迁移的状态
+#   cd backend && python -m app.migrations --check [库文件]   # 在副本上从现有版本升级到最新并逐个模型读一行，不动原库
+
+# 其他 worker 正在迁移时等写锁的上限（毫秒）；老库首次迁移要重建全文索引和汇总表，可能要好一会儿
+LOCK_TIMEOUT_MS = 600_000
+
+
+def _columns(conn, table: str) -> set[str]:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def add_column(conn, table: str, name: str, ddl: str) -> None:
+    # 新库由 create_all 直接按模型建表，列已经在了；老库才需要 ALTER
+    if name not in _columns(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def _create_tables(conn) -> None:
+    # 新库一次建好全部表；老库只补上缺少的表，已有的表不动
+    Base.metadata.create_all(conn)
+
+
+def _legacy_columns(conn) -> None:
+    add_column(conn, "order_items", "unit", "VARCHAR(10) DEFAULT '件' NOT NULL")
+    add_column(conn, "orders", "status", "VARCHAR(20) DEFAULT '未付款' NOT NULL")
+    add_column(conn, "products", "original_weight", "TEXT DEFAULT '无'")
+
+
+def _indexes(conn) -> None:
+    # 表建好之后才加进模型的索引（create_all 跳过已存在的表）
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_customer_name ON orders (customer_name)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_customer_id ON orders (customer_id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_status_created_at ON orders (status, created_at)",
+    ):
+        conn.exec_driver_sql(ddl)
+
+
+def _fill_defaults(conn) -> None:
+    # sku 有唯一索引，只能有一个商品用 '无'，其余冲突的空 SKU 保持原样
+    conn.exec_driver_sql("UPDATE OR IGNORE products SET sku = '无' WHERE sku IS NULL OR sku = ''")
+    conn.exec_driver_sql("UPDATE customers SET phone = '无' WHERE phone IS NULL OR phone = ''")
+
+
+def _seed(conn) -> None:
+    # 迁移按编号依次执行，模型上后来才补的列（如 row_version）此时在老库里还没有：
+    # 这里只查单列、用 Core 按给出的列插入，不要整行加载或经 ORM 写入模型
+    if conn.execute(select(User.id).where(User.username == "admin")).first() is None:
+        conn.execute(insert(User), {"username": "admin", "password_hash": get_password_hash("admin"), "display_name": "管理员"})
+    if conn.execute(select(Product.id).limit(1)).first() is None:
+        conn.execute(insert(Product), [
+            {"name": "苹果", "sku": "APL-001", "price": 5.5, "stock": 100, "description": "新鲜苹果"},
+            {"name": "香蕉", "sku": "BAN-001", "price": 4.2, "stock": 80, "description": "进口香蕉"},
+            {"name": "牛奶", "sku": "MLK-001", "price": 6.8, "stock": 60, "description": "纯牛奶"},
+        ])
+    if conn.execute(select(Customer.id).limit(1)).first() is None:
+        conn.execute(insert(Customer), {"name": "张三", "phone": "13800000000", "address": "北京市海淀区"})
+
+
+def _opening_balances(conn) -> None:
+    ensure_opening_balances(Session(bind=conn))
+
+
+def _archive_support(conn) -> None:
+    # 归档目录表与搬迁标记表；销售汇总的两个删除触发器删掉后按新定义（带搬迁标记判断）重建
+    OrderArchive.__table__.create(conn, checkfirst=True)
+    conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS archive_in_progress (id INTEGER PRIMARY KEY)")
+    for name in ("orders_sales_ad", "order_items_sales_ad"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    ensure_report_tables(conn)
+
+
+def _row_versions(conn) -> None:
+    for table in SYNC_TABLES:
+        add_column(conn, table, "row_version", "INTEGER DEFAULT 0 NOT NULL")
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_row_version ON {table} (row_version)")
+    ensure_sync_tables(conn)
+
+
+def _drop_customer_name_index(conn) -> None:
+    # 订单按客户检索走客户全文索引，手填客户名只做 LIKE '%词%'，用不上这个索引，白白拖慢写入
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_orders_customer_name")
+
+
+# (编号, 说明, 迁移函数)；迁移函数收到的连接已在事务里，不要自行提交
+MIGRATIONS = [
+    (1, "建表", _create_tables),
+    (2, "补列 order_items.unit / orders.status / products.original_weight", _legacy_columns),
+    (3, "补建订单索引", _indexes),
+    (4, "补全空的 SKU / 电话", _fill_defaults),
+    (5, "全文索引", ensure_fts_tables),
+    (6, "表版本号", ensure_version_table),
+    (7, "销售汇总触发器", ensure_report_tables),
+    (8, "初始数据", _seed),
+    (9, "库存期初", _opening_balances),
+    (10, "订单归档", _archive_support),
+    (11, "行版本号与删除记录（增量同步）", _row_versions),
+    (12, "删除用不上的 ix_orders_customer_name", _drop_customer_name_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _schema_version(conn) -> int:
+    try:
+        return conn.exec_driver_sql("SELECT MAX(version) FROM schema_version").scalar() or 0
+    except OperationalError:  # 新库或升级前的老库：还没有 schema_version
+        conn.rollback()
+        return 0
+
+
+def applied_migrations(conn) -> dict[int, datetime]:
+    try:
+        return dict(conn.exec_driver_sql("SELECT version, applied_at FROM schema_version").all())
+    except OperationalError:
+        conn.rollback()
+        return {}
+
+
+def migrate(engine) -> list[int]:
+    # 返回本次执行的迁移编号；已是最新时只有一条查询
+    with engine.connect() as conn:
+        if _schema_version(conn) >= LATEST_VERSION:
+            return []
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS schema_version "
+            "(version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at DATETIME NOT NULL)"
+        )
+        conn.commit()
+        previous_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {LOCK_TIMEOUT_MS}")
+        applied = []
+        try:
+            for version, name, fn in MIGRATIONS:
+                # pysqlite 不会为 DDL 自动开事务，这里显式开写事务，DDL 与版本记录一起提交或回滚
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                try:
+                    if _schema_version(conn) >= version:
+                        conn.rollback()
+                        continue
+                    fn(conn)
+                    conn.exec_driver_sql(
+                        "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                        (version, name, datetime.utcnow()),
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied.append(version)
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {previous_timeout}")
+        return applied
+
+
+def check_upgrade(path: str) -> list[int]:
+    # 把 path 复制一份，在副本上执行全部待执行的迁移，再用 ORM 把每个模型整行读一条，
+    # 确认表结构与模型一致；返回副本上执行的迁移编号，失败时抛出异常
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"找不到库文件 {path}")
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, os.path.basename(path))
+        source, target = sqlite3.connect(path), sqlite3.connect(copy)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        engine = create_engine(f"sqlite:///{copy}")
+        try:
+            applied = migrate(engine)
+            with engine.connect() as conn:
+                version = _schema_version(conn)
+            if version != LATEST_VERSION:
+                raise RuntimeError(f"升级后版本为 {version}，应为 {LATEST_VERSION}")
+            with Session(engine) as db:
+                for mapper in Base.registry.mappers:
+                    db.query(mapper.class_).first()
+        finally:
+            engine.dispose()
+    return applied
+
+
+def main() -> int:
+    from .database import engine
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--status", action="store_true", help="只列出状态，不执行")
+    parser.add_argument("--check", nargs="?", const="jinxiaocun.db", metavar="库文件", help="在副本上试升级，不动原库")
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            applied = check_upgrade(args.check)
+        except Exception as exc:
+            print(f"[FAIL] {args.check} 升级失败: {exc}")
+            return 1
+        print(f"[OK] {args.check} 可升级到版本 {LATEST_VERSION}（副本上执行了 {len(applied)} 个迁移）")
+        return 0
+    if not args.status:
+        applied = migrate(engine)
+        print(f"[OK] 执行了 {len(applied)} 个迁移" if applied else "[OK] 已是最新版本")
+    with engine.connect() as conn:
+        done = applied_migrations(conn)
+    for version, name, _ in MIGRATIONS:
+        state = f"已执行 {done[version]}" if version in done else "待执行"
+        print(f"  {version:>3}  {state:<32} {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
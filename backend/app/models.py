@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -22,6 +22,8 @@ class Product(Base):
     stock = Column(Float, nullable=False, default=0.0)
     description = Column(String(500))
     original_weight = Column(String(50), default="无")
+    # 行版本号：由 app.sync 的触发器在每次写入时更新，应用代码不要自己写
+    row_version = Column(Integer, nullable=False, server_default="0", index=True)
 
     items = relationship("OrderItem", back_populates="product")
 
@@ -32,6 +34,7 @@ class Customer(Base):
     name = Column(String(200), nullable=False)
     phone = Column(String(50), default="无")
     address = Column(String(300))
+    row_version = Column(Integer, nullable=False, server_default="0", index=True)
 
     orders = relationship("Order", back_populates="customer")
 
@@ -39,28 +42,106 @@ class Customer(Base):
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True, index=True)
     customer_name = Column(String(200))
     customer_phone = Column(String(50))
     customer_address = Column(String(300))
     total_amount = Column(Float, default=0.0)
     status = Column(String(20), nullable=False, default="未付款")
+    row_version = Column(Integer, nullable=False, server_default="0", index=True)
 
     customer = relationship("Customer", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     product_name = Column(String(200), nullable=False)
     unit_price = Column(Float, nullable=False)
     quantity = Column(Float, nullable=False, default=1.0)
     unit = Column(String(10), nullable=False, default="件")
     subtotal = Column(Float, nullable=False, default=0.0)
+    row_version = Column(Integer, nullable=False, server_default="0", index=True)
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="items")
+
+
+# 销售汇总表：由 app.reports 里的触发器随订单写入增量维护，报表接口只读这几张表。
+# day 为 created_at 的日期（UTC，与 created_at 一致）
+class DailySales(Base):
+    __tablename__ = "sales_daily"
+    day = Column(String(10), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class ProductDailySales(Base):
+    __tablename__ = "sales_product_daily"
+    day = Column(String(10), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    line_count = Column(Integer, nullable=False, default=0)
+    quantity = Column(Float, nullable=False, default=0.0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class CustomerDailySales(Base):
+    __tablename__ = "sales_customer_daily"
+    day = Column(String(10), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    customer_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+# 库存流水：只追加，每次库存变动一行（delta 为变动量）；按斤卖的商品不记库存，也不记流水
+class InventoryMovement(Base):
+    __tablename__ = "inventory_movements"
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    delta = Column(Float, nullable=False)
+    reason = Column(String(20), nullable=False)
+    order_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_inventory_movements_product_id_id", "product_id", "id"),
+    )
+
+
+# 库存快照：截至 movement_id（含）这条流水时该商品的库存
+class InventorySnapshot(Base):
+    __tablename__ = "inventory_snapshots"
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    movement_id = Column(Integer, nullable=False)
+    stock = Column(Float, nullable=False)
+    taken_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_inventory_snapshots_product_id_taken_at", "product_id", "taken_at"),
+    )
+
+
+# 订单归档目录：每个年份一个归档库文件（见 app.archive），记录其中的订单数与 id / 下单时间范围
+class OrderArchive(Base):
+    __tablename__ = "order_archives"
+    year = Column(Integer, primary_key=True)
+    path = Column(String(300), nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    min_id = Column(Integer, nullable=False)
+    max_id = Column(Integer, nullable=False)
+    first_created_at = Column(DateTime, nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
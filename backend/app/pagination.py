@@ -0,0 +1,98 @@
+import base64
+import binascii
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+from .versions import table_versions
+
+
+# 总数缓存：翻页时不再每次执行 COUNT(*)。缓存键的第一项为表版本号的名字（products / customers / orders），
+# 取数时与查询所依赖各表的当前版本比对，任何写入（改名、改状态、其他 worker 或批量导入的写入）都会让旧的总数作废。
+# 键里带着用户输入的检索词，按最近使用只留 COUNT_CACHE_SIZE 条
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_SIZE = 1000
+_count_cache: OrderedDict[tuple, tuple[float, dict[str, int], int]] = OrderedDict()
+
+
+def encode_cursor(direction: str, last_id: int) -> str:
+    raw = f"{direction}:{last_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, value = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        if direction not in ("a", "b"):
+            raise ValueError(direction)
+        return direction, int(value)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="分页游标不合法")
+
+
+def cached_count(query, key: tuple, tables: tuple[str, ...] | None = None) -> int:
+    # tables 为查询结果依赖的表版本名，默认只有 key[0]（如订单检索还要看 customers）
+    now = time.monotonic()
+    versions = table_versions(query.session, tables or (key[0],))
+    hit = _count_cache.get(key)
+    if hit and hit[0] > now and hit[1] == versions:
+        _count_cache.move_to_end(key)
+        return hit[2]
+    total = query.order_by(None).count()
+    _count_cache[key] = (now + COUNT_CACHE_TTL, versions, total)
+    _count_cache.move_to_end(key)
+    while len(_count_cache) > COUNT_CACHE_SIZE:
+        _count_cache.popitem(last=False)
+    return total
+
+
+# 按主键倒序分页；传 after_id / before_id / cursor 时走 keyset 定位，否则走 OFFSET。
+# 传 order_by（如全文检索的相关度排序）时只支持 OFFSET 分页
+def paginate(
+    query,
+    id_column,
+    count_key: tuple,
+    page: int,
+    page_size: int,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    cursor: str | None = None,
+    with_total: bool = True,
+    order_by: tuple | None = None,
+    count_tables: tuple[str, ...] | None = None,
+) -> dict:
+    if order_by is not None and (cursor or after_id is not None or before_id is not None):
+        raise HTTPException(status_code=400, detail="按相关度排序时不支持游标分页")
+    if cursor:
+        direction, value = decode_cursor(cursor)
+        if direction == "a":
+            after_id = value
+        else:
+            before_id = value
+    if after_id is not None and before_id is not None:
+        raise HTTPException(status_code=400, detail="after_id 与 before_id 不能同时使用")
+
+    if after_id is not None:
+        rows = query.filter(id_column < after_id).order_by(id_column.desc()).limit(page_size + 1).all()
+        has_next, has_prev = len(rows) > page_size, True
+        rows = rows[:page_size]
+    elif before_id is not None:
+        rows = query.filter(id_column > before_id).order_by(id_column.asc()).limit(page_size + 1).all()
+        has_next, has_prev = True, len(rows) > page_size
+        rows = rows[:page_size][::-1]
+    else:
+        order = order_by if order_by is not None else (id_column.desc(),)
+        rows = query.order_by(*order).offset((page - 1) * page_size).limit(page_size + 1).all()
+        has_next, has_prev = len(rows) > page_size, page > 1
+        rows = rows[:page_size]
+
+    return {
+        "items": rows,
+        "total": cached_count(query, count_key, count_tables) if with_total else None,
+        "page": page,
+        "page_size": page_size,
+        "next_cursor": encode_cursor("a", rows[-1].id) if rows and has_next and order_by is None else None,
+        "prev_cursor": encode_cursor("b", rows[0].id) if rows and has_prev and order_by is None else None,
+    }
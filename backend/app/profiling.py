@@ -0,0 +1,224 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+
+# 请求级性能剖析：JXC_PROFILING=1 时启用（默认关闭）。
+# 每个请求统计 SQL 条数与耗时（挂在 engine 的 cursor 事件上）、序列化和认证耗时，写进 Server-Timing 响应头；
+# 超过 JXC_SLOW_MS 毫秒的请求连同其 SQL 记一条 WARNING；/metrics 按路由输出 Prometheus 直方图（每个进程各自统计）。
+# 关闭时不挂事件、不加中间件，代码里的 timed() 只剩一次 ContextVar 读取
+PROFILING = os.getenv("JXC_PROFILING", "0").lower() in ("1", "true", "yes", "on")
+SLOW_MS = float(os.getenv("JXC_SLOW_MS", "500"))
+
+# 慢请求日志里最多列出的 SQL 条数与每条的长度
+SLOW_LOG_STATEMENTS = 50
+SLOW_LOG_STATEMENT_CHARS = 300
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.sections: dict[str, float] = {}
+        self.statements: list[tuple[str, float]] = []
+
+    def timings(self) -> dict[str, float]:
+        # 各段互不重叠：认证、序列化里的 SQL 只算在 db 里，剩下的归 app（业务逻辑、参数校验等）
+        total = time.perf_counter() - self.started
+        result = {"db": self.db_seconds, **self.sections}
+        result["app"] = max(0.0, total - sum(result.values()))
+        result["total"] = total
+        return result
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def _section(profile: RequestProfile, name: str):
+    started, db_before = time.perf_counter(), profile.db_seconds
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (profile.db_seconds - db_before)
+        profile.sections[name] = profile.sections.get(name, 0.0) + max(0.0, elapsed)
+
+
+class _NoSection:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SECTION = _NoSection()
+
+
+def timed(name: str):
+    # with timed("serialize"): ...；未启用或不在请求里时什么都不做
+    profile = _current.get()
+    if profile is None:
+        return _NO_SECTION
+    return _section(profile, name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = conn.info.pop("query_started", None)
+    if profile is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    profile.db_seconds += elapsed
+    profile.queries += 1
+    profile.statements.append((statement, elapsed))
+
+
+def instrument_engine(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # (method, route) -> [各桶计数..., 总数, 总和]
+        self.series: dict[tuple[str, str], list[float]] = {}
+
+    def observe(self, labels: tuple[str, str], value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for (method, route), series in sorted(self.series.items()):
+            labels = f'method="{method}",route="{route}"'
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-2]}')
+            lines.append(f"{self.name}_count{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:.6f}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("jxc_request_duration_seconds", "请求总耗时（秒）", DURATION_BUCKETS)
+DB_SECONDS = Histogram("jxc_request_db_seconds", "请求内 SQL 耗时合计（秒）", DURATION_BUCKETS)
+SQL_QUERIES = Histogram("jxc_request_sql_queries", "请求内执行的 SQL 条数", QUERY_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS, DB_SECONDS, SQL_QUERIES)
+
+
+def _route_template(scope) -> str:
+    # 用路由模板（/orders/{order_id}）而不是实际路径做标签，未匹配的请求归到一起，避免标签爆炸
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _server_timing(profile: RequestProfile, timings: dict[str, float]) -> bytes:
+    parts = []
+    for name, seconds in timings.items():
+        desc = f';desc="{profile.queries} queries"' if name == "db" else ""
+        parts.append(f"{name};dur={seconds * 1000:.2f}{desc}")
+    return ", ".join(parts).encode("latin-1")
+
+
+def _log_slow(scope, status: int, profile: RequestProfile, timings: dict[str, float]) -> None:
+    lines = [
+        f"慢请求 {scope['method']} {scope['path']} -> {status}: "
+        + ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in timings.items())
+        + f", {profile.queries} 条 SQL"
+    ]
+    for statement, seconds in profile.statements[:SLOW_LOG_STATEMENTS]:
+        lines.append(f"  {seconds * 1000:8.2f}ms  {' '.join(statement.split())[:SLOW_LOG_STATEMENT_CHARS]}")
+    if len(profile.statements) > SLOW_LOG_STATEMENTS:
+        lines.append(f"  ... 另有 {len(profile.statements) - SLOW_LOG_STATEMENTS} 条")
+    logger.warning("\n".join(lines))
+
+
+def _observe(scope, status: int, profile: RequestProfile) -> None:
+    timings = profile.timings()
+    labels = (scope["method"], _route_template(scope))
+    REQUEST_SECONDS.observe(labels, timings["total"])
+    DB_SECONDS.observe(labels, timings["db"])
+    SQL_QUERIES.observe(labels, profile.queries)
+    if timings["total"] * 1000 >= SLOW_MS:
+        _log_slow(scope, status, profile, timings)
+
+
+class ProfilingMiddleware:
+    # 纯 ASGI 中间件：不像 BaseHTTPMiddleware 那样再套一层任务，ContextVar 能一路传到接口和线程池里
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = _current.set(profile)
+        status = 500
+        event_stream = False
+
+        async def send_with_timing(message):
+            nonlocal status, event_stream
+            if message["type"] == "http.response.start":
+                # 响应体在这之前已经渲染好，此时的计时就是整个请求的；流式导出只计到开始输出为止
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                event_stream = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream") for name, value in headers
+                )
+                headers.append((b"server-timing", _server_timing(profile, profile.timings())))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # 推送长连接的时长不是处理耗时，不计入直方图和慢请求日志
+            if not event_stream:
+                _observe(scope, status, profile)
+
+
+router = APIRouter(tags=["监控"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+def setup(app, engines) -> None:
+    # 只在启用时调用：挂 SQL 事件、中间件和 /metrics
+    for engine in engines:
+        instrument_engine(engine)
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(router)
@@ -0,0 +1,56 @@
+import sys
+from datetime import datetime
+
+from sqlalchemy import func
+
+from .database import SessionLocal, engine
+from .models import Order, OrderItem
+from .routers.orders import filter_orders
+
+
+# 用 EXPLAIN QUERY PLAN 校验订单查询确实命中索引：
+#   cd backend && python -m app.query_plans
+def explain(db, query) -> list[str]:
+    compiled = query.statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(
+        str(v) if isinstance(v, datetime) else v
+        for v in (compiled.params[k] for k in compiled.positiontup)
+    )
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def order_query_checks(db) -> list[tuple[str, object, str]]:
+    def orders(**filters):
+        return filter_orders(db.query(Order), **filters).order_by(Order.id.desc()).limit(20)
+
+    return [
+        ("date range", orders(date_from="2026-09-01", date_to="2026-09-30"), "ix_orders_created_at"),
+        ("created_date", orders(created_date="2026-09-30"), "ix_orders_created_at"),
+        ("date prefix q", orders(q="2026-09"), "ix_orders_created_at"),
+        ("unpaid", orders(status="未付款"), "ix_orders_status_created_at"),
+        ("unpaid by date", orders(status="未付款", date_from="2026-09-01"), "ix_orders_status_created_at"),
+        ("customer search", orders(q="北京市"), "ix_orders_customer_id"),
+        ("status totals", db.query(Order.status, func.count(Order.id)).group_by(Order.status), "ix_orders_status_created_at"),
+        ("order items", db.query(OrderItem).filter(OrderItem.order_id.in_([1, 2, 3])), "ix_order_items_order_id"),
+    ]
+
+
+def main() -> int:
+    db = SessionLocal()
+    failed = 0
+    try:
+        for name, query, index in order_query_checks(db):
+            plan = explain(db, query)
+            ok = any(index in line for line in plan)
+            failed += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}: expect {index}")
+            for line in plan:
+                print(f"    {line}")
+    finally:
+        db.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
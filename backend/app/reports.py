@@ -0,0 +1,177 @@
+import argparse
+import sys
+
+from .archive import order_sources
+
+
+# 销售汇总表（见 models.DailySales 等）由订单表上的触发器在同一事务里增量维护：
+# 下单、改单、增删订单项、切换付款状态，以及批量导入都会落到汇总表里，报表查询不再扫描订单明细。
+# 重建 / 漂移检查：
+#   cd backend && python -m app.reports            # 检查漂移后从头重建
+#   cd backend && python -m app.reports --check    # 只检查，有漂移时返回 1
+
+# 表名 -> (主键列, 累加列, 从订单明细重新汇总的 SELECT)；{orders} / {order_items} 换成主库或某个归档库的表
+AGGREGATES = {
+    "sales_daily": (
+        ("day", "status"),
+        ("order_count", "revenue"),
+        """SELECT date(created_at), status, COUNT(*), SUM(COALESCE(total_amount, 0))
+           FROM {orders} GROUP BY 1, 2""",
+    ),
+    "sales_customer_daily": (
+        ("day", "status", "customer_id"),
+        ("order_count", "revenue"),
+        """SELECT date(created_at), status, COALESCE(customer_id, 0), COUNT(*), SUM(COALESCE(total_amount, 0))
+           FROM {orders} GROUP BY 1, 2, 3""",
+    ),
+    "sales_product_daily": (
+        ("day", "status", "product_id"),
+        ("line_count", "quantity", "revenue"),
+        """SELECT date(o.created_at), o.status, i.product_id, COUNT(*), SUM(i.quantity), SUM(i.subtotal)
+           FROM {order_items} i JOIN {orders} o ON o.id = i.order_id GROUP BY 1, 2, 3""",
+    ),
+}
+
+# 浮点累加/扣减的误差容忍
+DRIFT_TOLERANCE = 1e-6
+
+# 归档搬迁期间（app.archive）这张表里有一行，删除触发器据此跳过，已归档的订单仍计在汇总表里
+ARCHIVE_GUARD = "WHEN NOT EXISTS (SELECT 1 FROM archive_in_progress)"
+
+
+def _upsert(table: str, values_sql: str) -> str:
+    keys, values, _ = AGGREGATES[table]
+    columns = ", ".join(keys + values)
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in values)
+    return f"INSERT INTO {table} ({columns}) {values_sql} ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates};"
+
+
+def _order_rows(ref: str, sign: int) -> str:
+    # 订单级汇总；未关联客户的订单记在 customer_id = 0 下
+    day, amount = f"date({ref}.created_at)", f"{sign} * COALESCE({ref}.total_amount, 0)"
+    return (
+        _upsert("sales_daily", f"VALUES ({day}, {ref}.status, {sign}, {amount})")
+        + _upsert("sales_customer_daily", f"VALUES ({day}, {ref}.status, COALESCE({ref}.customer_id, 0), {sign}, {amount})")
+    )
+
+
+def _items_of_order(ref: str, sign: int) -> str:
+    # 订单 ref 名下现有的全部订单项，记在该订单的日期/状态下
+    return _upsert(
+        "sales_product_daily",
+        f"SELECT date({ref}.created_at), {ref}.status, product_id, {sign}, {sign} * quantity, {sign} * subtotal "
+        f"FROM order_items WHERE order_id = {ref}.id",
+    )
+
+
+def _item(ref: str, sign: int) -> str:
+    # 单个订单项，日期/状态取所属订单；订单已删除时不再计入（删除订单时已整体扣减）
+    return _upsert(
+        "sales_product_daily",
+        f"SELECT date(o.created_at), o.status, {ref}.product_id, {sign}, {sign} * {ref}.quantity, {sign} * {ref}.subtotal "
+        f"FROM orders o WHERE o.id = {ref}.order_id",
+    )
+
+
+def _trigger_ddl() -> list[str]:
+    triggers = {
+        "orders_sales_ai": ("AFTER INSERT ON orders", _order_rows("new", 1)),
+        "orders_sales_au": (
+            "AFTER UPDATE OF created_at, status, customer_id, total_amount ON orders",
+            _order_rows("old", -1) + _order_rows("new", 1),
+        ),
+        "orders_sales_items_au": (
+            "AFTER UPDATE OF created_at, status ON orders",
+            _items_of_order("old", -1) + _items_of_order("new", 1),
+        ),
+        "orders_sales_ad": (
+            f"AFTER DELETE ON orders {ARCHIVE_GUARD}", _order_rows("old", -1) + _items_of_order("old", -1)
+        ),
+        "order_items_sales_ai": ("AFTER INSERT ON order_items", _item("new", 1)),
+        "order_items_sales_au": (
+            "AFTER UPDATE OF order_id, product_id, quantity, subtotal ON order_items",
+            _item("old", -1) + _item("new", 1),
+        ),
+        "order_items_sales_ad": (f"AFTER DELETE ON order_items {ARCHIVE_GUARD}", _item("old", -1)),
+    }
+    return [f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END" for name, (event, body) in triggers.items()]
+
+
+def rebuild(conn) -> None:
+    # 主库和各归档库的订单明细一起重新汇总；归档库要在写入开始前全部 ATTACH 好
+    sources = list(order_sources(conn))
+    for table, (keys, values, select) in AGGREGATES.items():
+        conn.exec_driver_sql(f"DELETE FROM {table}")
+        for orders, items in sources:
+            conn.exec_driver_sql(_upsert(table, select.format(orders=orders, order_items=items)))
+
+
+def _fresh(conn, table: str, sources) -> dict[tuple, tuple]:
+    keys, values, select = AGGREGATES[table]
+    n = len(keys)
+    fresh: dict[tuple, tuple] = {}
+    for orders, items in sources:
+        for row in conn.exec_driver_sql(select.format(orders=orders, order_items=items)):
+            key, have = row[:n], fresh.get(row[:n])
+            fresh[key] = row[n:] if have is None else tuple(a + b for a, b in zip(have, row[n:]))
+    return fresh
+
+
+def check_drift(conn) -> dict[str, list[tuple]]:
+    # 返回各表与重新汇总结果不一致的行：(主键, 汇总表里的值, 应有的值)；汇总表里全为 0 的行视同不存在
+    sources = list(order_sources(conn))
+    drift = {}
+    for table, (keys, values, select) in AGGREGATES.items():
+        n = len(keys)
+        fresh = _fresh(conn, table, sources)
+        stored = {
+            row[:n]: row[n:]
+            for row in conn.exec_driver_sql(f"SELECT {', '.join(keys + values)} FROM {table}")
+        }
+        zero = (0,) * len(values)
+        rows = []
+        for key in sorted(fresh.keys() | stored.keys(), key=str):
+            have, want = stored.get(key, zero), fresh.get(key, zero)
+            if any(abs(a - b) > DRIFT_TOLERANCE for a, b in zip(have, want)):
+                rows.append((key, have, want))
+        if rows:
+            drift[table] = rows
+    return drift
+
+
+def ensure_report_tables(conn) -> None:
+    # 汇总表由 create_all 建好；触发器首次创建时（老库升级）顺带从现有订单汇总一遍
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'orders_sales_ai'"
+    ).first()
+    for ddl in _trigger_ddl():
+        conn.exec_driver_sql(ddl)
+    if not exists:
+        rebuild(conn)
+
+
+def main() -> int:
+    from .database import engine
+    from .migrations import migrate
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="只检查漂移，不重建")
+    args = parser.parse_args()
+
+    migrate(engine)
+    with engine.begin() as conn:
+        drift = check_drift(conn)
+        for table, rows in drift.items():
+            print(f"[DRIFT] {table}: {len(rows)} 行不一致")
+            for key, have, want in rows[:20]:
+                print(f"    {key}: 汇总表 {have} / 应为 {want}")
+        if not drift:
+            print("[OK] 汇总表与订单明细一致")
+        if not args.check:
+            rebuild(conn)
+            print("[OK] 已重建汇总表")
+    return 1 if drift and args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
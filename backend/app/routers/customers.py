@@ -1,77 +1,177 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from ..database import SessionLocal
+from ..database import Database, get_db
 from ..models import Customer
-from ..schemas import CustomerCreate, CustomerUpdate, CustomerOut, CustomerPage
+from ..schemas import CustomerBatch, CustomerCreate, CustomerUpdate, CustomerOut, CustomerPage
 from ..auth import get_current_user
+from ..pagination import paginate
+from ..search import fts_search
+from ..versions import check_not_modified
+from ..serialization import FastJSONResponse, RowShape, batch_result, parse_fields, parse_ids
+from ..exporting import export_response
+from ..events import stage
+from .stats import invalidate_summary
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+CUSTOMER_ROW = RowShape(CustomerOut, Customer)
+
+
+def _customer_fields(customer: Customer, names) -> dict:
+    return {name: getattr(customer, name) for name in names if name != "id"}
 
 
 router = APIRouter(prefix="/customers", tags=["客户"], dependencies=[Depends(get_current_user)])
 
 
 @router.get("/", response_model=list[CustomerOut])
-def list_customers(
+async def list_customers(
+    request: Request,
+    response: Response,
     page: int | None = Query(None, ge=1),
     page_size: int | None = Query(None, ge=1, le=200),
-    db: Session = Depends(get_db),
+    fields: str | None = Query(None),
+    database: Database = Depends(get_db),
 ):
-    q = db.query(Customer).order_by(Customer.id.desc())
-    if page and page_size:
-        return q.offset((page - 1) * page_size).limit(page_size).all()
-    return q.all()
+    shape = CUSTOMER_ROW.only(parse_fields(fields))
+    not_modified = await check_not_modified(request, response, database, "customers")
+    if not_modified:
+        return not_modified
+
+    def work(db: Session):
+        q = db.query(*shape.columns).order_by(Customer.id.desc())
+        if page and page_size:
+            q = q.offset((page - 1) * page_size).limit(page_size)
+        return shape.dump(q.all())
+
+    items, plain = await database.run(work)
+    return FastJSONResponse(items, plain, headers=response.headers)
 
 
 @router.post("/", response_model=CustomerOut)
-def create_customer(payload: CustomerCreate, db: Session = Depends(get_db)):
-    if not payload.phone:
-        payload.phone = "无"
-    customer = Customer(**payload.dict())
-    db.add(customer)
-    db.commit()
-    db.refresh(customer)
-    return customer
+async def create_customer(payload: CustomerCreate, database: Database = Depends(get_db)):
+    def work(db: Session):
+        if not payload.phone:
+            payload.phone = "无"
+        customer = Customer(**payload.dict())
+        db.add(customer)
+        db.flush()
+        stage(db, "customers", customer.id, "create", **_customer_fields(customer, CUSTOMER_ROW.fields))
+        db.commit()
+        invalidate_summary()
+        db.refresh(customer)
+        return customer
+
+    return await database.run(work)
 
 
 @router.put("/{customer_id}", response_model=CustomerOut)
-def update_customer(customer_id: int, payload: CustomerUpdate, db: Session = Depends(get_db)):
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
-    if not customer:
-        raise HTTPException(status_code=404, detail="客户不存在")
-    for key, value in payload.dict(exclude_unset=True).items():
-        setattr(customer, key, value)
-    
-    if not customer.phone:
-        customer.phone = "无"
-        
-    db.commit()
-    db.refresh(customer)
-    return customer
+async def update_customer(customer_id: int, payload: CustomerUpdate, database: Database = Depends(get_db)):
+    def work(db: Session):
+        customer = db.query(Customer).filter(Customer.id == customer_id).first()
+        if not customer:
+            raise HTTPException(status_code=404, detail="客户不存在")
+        changes = payload.dict(exclude_unset=True)
+        for key, value in changes.items():
+            setattr(customer, key, value)
+
+        if not customer.phone:
+            customer.phone = "无"
+
+        stage(db, "customers", customer.id, "update", **_customer_fields(customer, changes))
+        db.commit()
+        db.refresh(customer)
+        return customer
+
+    return await database.run(work)
 
 
 @router.delete("/{customer_id}")
-def delete_customer(customer_id: int, db: Session = Depends(get_db)):
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
-    if not customer:
-        raise HTTPException(status_code=404, detail="客户不存在")
-    db.delete(customer)
-    db.commit()
-    return {"message": "已删除"}
+async def delete_customer(customer_id: int, database: Database = Depends(get_db)):
+    def work(db: Session):
+        customer = db.query(Customer).filter(Customer.id == customer_id).first()
+        if not customer:
+            raise HTTPException(status_code=404, detail="客户不存在")
+        db.delete(customer)
+        stage(db, "customers", customer_id, "delete")
+        db.commit()
+        invalidate_summary()
+        return {"message": "已删除"}
+
+    return await database.run(work)
+
+
 @router.get("/page", response_model=CustomerPage)
-def list_customers_paged(
+async def list_customers_paged(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=200),
-    db: Session = Depends(get_db),
+    after_id: int | None = Query(None),
+    before_id: int | None = Query(None),
+    cursor: str | None = Query(None),
+    q: str | None = Query(None),
+    with_total: bool = Query(True),
+    fields: str | None = Query(None),
+    database: Database = Depends(get_db),
+):
+    shape = CUSTOMER_ROW.only(parse_fields(fields))
+    not_modified = await check_not_modified(request, response, database, "customers")
+    if not_modified:
+        return not_modified
+
+    q = q.strip() if q else None
+
+    def work(db: Session):
+        query = db.query(*shape.columns)
+        order_by = None
+        if q:
+            hits = fts_search("customers", q)
+            query = query.join(hits, hits.c.id == Customer.id)
+            order_by = (hits.c.rank, Customer.id.desc())
+        result = paginate(query, Customer.id, ("customers", q), page, page_size, after_id, before_id, cursor, with_total, order_by)
+        result["items"], plain = shape.dump(result["items"])
+        return result, plain
+
+    result, plain = await database.run(work)
+    return FastJSONResponse(result, plain, headers=response.headers)
+
+
+@router.get("/batch", response_model=CustomerBatch)
+async def get_customers_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="逗号分隔的客户 id"),
+    fields: str | None = Query(None),
+    database: Database = Depends(get_db),
+):
+    # 按 id 一次取多条，结果与 ids 顺序一致，查不到的为 null
+    customer_ids = parse_ids(ids)
+    shape = CUSTOMER_ROW.only(parse_fields(fields))
+    not_modified = await check_not_modified(request, response, database, "customers")
+    if not_modified:
+        return not_modified
+
+    def work(db: Session):
+        rows = db.query(*shape.columns).filter(Customer.id.in_(list(dict.fromkeys(customer_ids)))).all()
+        items, plain = shape.dump(rows)
+        return batch_result(customer_ids, {item["id"]: item for item in items}), plain
+
+    result, plain = await database.run(work)
+    return FastJSONResponse(result, plain, headers=response.headers)
+
+
+CUSTOMER_EXPORT_HEADER = ["ID", "名称", "电话", "地址"]
+
+
+@router.get("/export")
+def export_customers(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    q: str | None = Query(None),
 ):
-    q = db.query(Customer).order_by(Customer.id.desc())
-    total = q.count()
-    items = q.offset((page - 1) * page_size).limit(page_size).all()
-    return {"items": items, "total": total, "page": page, "page_size": page_size}
+    stmt = select(Customer.id, Customer.name, Customer.phone, Customer.address).order_by(Customer.id.desc())
+    if q and q.strip():
+        hits = fts_search("customers", q.strip())
+        stmt = stmt.join(hits, hits.c.id == Customer.id)
+    return export_response("customers", fmt, CUSTOMER_EXPORT_HEADER, stmt)
@@ -1,181 +1,484 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
 
-from ..database import SessionLocal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session, selectinload
+
+from ..database import Database, SessionLocal, get_db
 from ..models import Order, OrderItem, Product, Customer
-from ..schemas import OrderCreate, OrderOut, OrderPage, OrderItemCreate
+from ..schemas import OrderBatch, OrderCreate, OrderOut, OrderPage, OrderPatch, OrderItemCreate, OrderItemOut
 from ..auth import get_current_user
+from ..pagination import paginate
+from ..search import fts_search
+from ..versions import check_not_modified
+from ..serialization import FastJSONResponse, RowShape, batch_result, parse_fields, parse_ids
+from ..inventory import REASON_ADD_ITEM, REASON_DELETE_ITEM, REASON_EDIT, REASON_ORDER, StockReservation
+from ..ingest import check_line, iter_order_payloads, ingest_chunk, line_values
+from ..exporting import export_response
+from ..events import stage
+from ..archive import archived_years, order_entities, years_holding
+from .stats import invalidate_summary
+
+
+router = APIRouter(prefix="/orders", tags=["订单"], dependencies=[Depends(get_current_user)])
+
+
+# q 形如 "2026"、"2026-10"、"2026-10-17 12:30" 时按时间前缀转成区间查询
+DATE_PREFIX_FORMATS = (
+    ("%Y-%m-%d %H:%M:%S", timedelta(seconds=1)),
+    ("%Y-%m-%d %H:%M", timedelta(minutes=1)),
+    ("%Y-%m-%d %H", timedelta(hours=1)),
+    ("%Y-%m-%d", timedelta(days=1)),
+    ("%Y-%m", None),
+    ("%Y", None),
+)
+
 
+def _date_prefix_range(text: str) -> tuple[datetime, datetime] | None:
+    for fmt, step in DATE_PREFIX_FORMATS:
+        try:
+            start = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if step is not None:
+            return start, start + step
+        if fmt == "%Y-%m":
+            end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+            return start, end
+        return start, start.replace(year=start.year + 1)
+    return None
 
-def get_db():
-    db = SessionLocal()
+
+def _parse_date(value: str) -> datetime:
     try:
-        yield db
-    finally:
-        db.close()
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"日期格式不合法: {value}")
 
 
-router = APIRouter(prefix="/orders", tags=["订单"], dependencies=[Depends(get_current_user)])
+def filter_orders(
+    query,
+    q: str | None = None,
+    created_date: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    status: str | None = None,
+    entity=Order,
+):
+    # 所有时间条件都落成 created_at >= start AND created_at < end，以便走 ix_orders_created_at。
+    # entity 为 Order 或包含归档库的订单别名（见 app.archive.order_entities）
+    if q:
+        rng = _date_prefix_range(q)
+        if rng:
+            query = query.filter(entity.created_at >= rng[0], entity.created_at < rng[1])
+        else:
+            # 复用客户全文索引；未关联客户的订单（手填客户信息）才回落到 customer_name LIKE
+            hits = fts_search("customers", q)
+            query = query.filter(or_(
+                entity.customer_id.in_(select(hits.c.id)),
+                and_(entity.customer_id.is_(None), entity.customer_name.like(f"%{q}%")),
+            ))
+    if created_date:
+        start = _parse_date(created_date)
+        query = query.filter(entity.created_at >= start, entity.created_at < start + timedelta(days=1))
+    if date_from:
+        query = query.filter(entity.created_at >= _parse_date(date_from))
+    if date_to:
+        # date_to 包含当天
+        query = query.filter(entity.created_at < _parse_date(date_to) + timedelta(days=1))
+    if status:
+        query = query.filter(entity.status == status)
+    return query
+
+
+def order_date_range(
+    q: str | None = None,
+    created_date: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+) -> tuple[datetime | None, datetime | None]:
+    # filter_orders 里各时间条件的交集 [start, end)；None 表示该侧不限
+    bounds = []
+    rng = _date_prefix_range(q) if q else None
+    if rng:
+        bounds.append(rng)
+    if created_date:
+        start = _parse_date(created_date)
+        bounds.append((start, start + timedelta(days=1)))
+    if date_from:
+        bounds.append((_parse_date(date_from), None))
+    if date_to:
+        bounds.append((None, _parse_date(date_to) + timedelta(days=1)))
+    starts = [start for start, _ in bounds if start is not None]
+    ends = [end for _, end in bounds if end is not None]
+    return (max(starts) if starts else None), (min(ends) if ends else None)
+
+
+def _order_sources(db: Session, filters: tuple):
+    # 时间范围落进已归档年份时返回带归档库的订单/订单项别名，否则就是主库的模型
+    return order_entities(db, archived_years(db, *order_date_range(*filters[:4])))
+
+
+def _clean(value: str | None) -> str | None:
+    return value.strip() or None if value else None
+
+
+ORDER_ROW = RowShape(OrderOut, Order, exclude=("items",))
+ORDER_ITEM_ROW = RowShape(OrderItemOut, OrderItem)
+# 与 selectinload 一致，每批最多 500 个订单号
+ITEM_BATCH_SIZE = 500
+# 变更推送里订单带的字段（订单项不推，前端需要时再取）
+ORDER_EVENT_FIELDS = ("created_at", "customer_id", "customer_name", "status", "total_amount")
+ORDER_CUSTOMER_FIELDS = ("customer_id", "customer_name", "customer_phone", "customer_address")
+
+
+def _order_shape(fields: str | None, include_items: bool) -> tuple[RowShape, bool]:
+    # 返回 (订单列, 是否带订单项)；fields 里没有 items 或 include_items=false 时完全不查 order_items
+    names = parse_fields(fields)
+    shape = ORDER_ROW.only(names)
+    return shape, include_items and (names is None or "items" in names)
+
+
+def _order_dicts(
+    db: Session, rows, shape: RowShape = ORDER_ROW, with_items: bool = True, items_entity=OrderItem
+) -> tuple[list[dict], bool]:
+    # 订单项按 order_id 批量查出后挂到各自订单上（items 是 OrderOut 的最后一个字段）
+    orders, plain = shape.dump(rows)
+    if not with_items:
+        return orders, plain
+    by_order = {order["id"]: order for order in orders}
+    for order in orders:
+        order["items"] = []
+    ids = list(by_order)
+    for start in range(0, len(ids), ITEM_BATCH_SIZE):
+        # order_id 放在末尾，dump 时 zip 只取前面的 schema 字段
+        item_rows = (
+            db.query(*ORDER_ITEM_ROW.columns_for(items_entity), items_entity.order_id)
+            .filter(items_entity.order_id.in_(ids[start:start + ITEM_BATCH_SIZE]))
+            .order_by(items_entity.order_id, items_entity.id)
+            .all()
+        )
+        items, items_plain = ORDER_ITEM_ROW.dump(item_rows)
+        plain = plain and items_plain
+        for row, item in zip(item_rows, items):
+            by_order[row.order_id]["items"].append(item)
+    return orders, plain
 
 
 @router.get("/page", response_model=OrderPage)
-def list_orders_paged(
+async def list_orders_paged(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=200),
     q: str | None = Query(None),
     created_date: str | None = Query(None),
-    db: Session = Depends(get_db),
+    date_from: str | None = Query(None),
+    date_to: str | None = Query(None),
+    status: str | None = Query(None),
+    after_id: int | None = Query(None),
+    before_id: int | None = Query(None),
+    cursor: str | None = Query(None),
+    with_total: bool = Query(True),
+    fields: str | None = Query(None),
+    include_items: bool = Query(True),
+    database: Database = Depends(get_db),
 ):
-    query = db.query(Order).order_by(Order.id.desc())
-    if q and q.strip():
-        like = f"%{q.strip()}%"
-        query = query.filter(func.coalesce(Order.customer_name, "").like(like))
-    if created_date and created_date.strip():
-        query = query.filter(func.strftime('%Y-%m-%d', Order.created_at) == created_date.strip())
-    total = query.count()
-    items = query.offset((page - 1) * page_size).limit(page_size).all()
-    return {"items": items, "total": total, "page": page, "page_size": page_size}
+    shape, with_items = _order_shape(fields, include_items)
+    not_modified = await check_not_modified(request, response, database, "orders", "customers")
+    if not_modified:
+        return not_modified
+
+    filters = (_clean(q), _clean(created_date), _clean(date_from), _clean(date_to), _clean(status))
+    count_key = ("orders",) + filters
+
+    def work(db: Session):
+        orders, items = _order_sources(db, filters)
+        query = filter_orders(db.query(*shape.columns_for(orders)), *filters, entity=orders)
+        result = paginate(
+            query, orders.id, count_key, page, page_size, after_id, before_id, cursor, with_total,
+            count_tables=("orders", "customers"),
+        )
+        result["items"], plain = _order_dicts(db, result["items"], shape, with_items, items)
+        return result, plain
+
+    result, plain = await database.run(work)
+    return FastJSONResponse(result, plain, headers=response.headers)
 
 
 @router.get("/", response_model=list[OrderOut])
-def list_orders(
+async def list_orders(
+    request: Request,
+    response: Response,
     page: int | None = Query(None, ge=1),
     page_size: int | None = Query(None, ge=1, le=200),
     q: str | None = Query(None),
     created_date: str | None = Query(None),
-    db: Session = Depends(get_db),
+    date_from: str | None = Query(None),
+    date_to: str | None = Query(None),
+    status: str | None = Query(None),
+    fields: str | None = Query(None),
+    include_items: bool = Query(True),
+    database: Database = Depends(get_db),
 ):
-    query = db.query(Order).order_by(Order.id.desc())
-    if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (func.coalesce(Order.customer_name, "").like(like)) |
-            (func.strftime('%Y-%m-%d %H:%M:%S', Order.created_at).like(like))
-        )
-    if created_date and created_date.strip():
-        query = query.filter(func.strftime('%Y-%m-%d', Order.created_at) == created_date.strip())
-    if page and page_size:
-        return query.offset((page - 1) * page_size).limit(page_size).all()
-    return query.all()
+    shape, with_items = _order_shape(fields, include_items)
+    not_modified = await check_not_modified(request, response, database, "orders", "customers")
+    if not_modified:
+        return not_modified
+
+    filters = (_clean(q), _clean(created_date), _clean(date_from), _clean(date_to), _clean(status))
+
+    def work(db: Session):
+        orders, items = _order_sources(db, filters)
+        query = db.query(*shape.columns_for(orders)).order_by(orders.id.desc())
+        query = filter_orders(query, *filters, entity=orders)
+        if page and page_size:
+            query = query.offset((page - 1) * page_size).limit(page_size)
+        return _order_dicts(db, query.all(), shape, with_items, items)
+
+    items, plain = await database.run(work)
+    return FastJSONResponse(items, plain, headers=response.headers)
+
+
+ORDER_EXPORT_HEADER = [
+    "订单号", "下单时间", "客户", "电话", "地址", "状态", "订单金额",
+    "商品ID", "商品", "单价", "数量", "单位", "小计",
+]
+
+
+@router.get("/export")
+def export_orders(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    q: str | None = Query(None),
+    created_date: str | None = Query(None),
+    date_from: str | None = Query(None),
+    date_to: str | None = Query(None),
+    status: str | None = Query(None),
+):
+    # 每个订单项一行，订单字段重复；时间范围落进已归档年份时在导出会话上 ATTACH 归档库
+    filters = (_clean(q), _clean(created_date), _clean(date_from), _clean(date_to), _clean(status))
+
+    def query(db: Session):
+        orders, items = _order_sources(db, filters)
+        stmt = select(
+            orders.id, orders.created_at, orders.customer_name, orders.customer_phone, orders.customer_address,
+            orders.status, orders.total_amount,
+            items.product_id, items.product_name, items.unit_price, items.quantity,
+            items.unit, items.subtotal,
+        ).outerjoin(items, items.order_id == orders.id)
+        stmt = filter_orders(stmt, *filters, entity=orders)
+        return stmt.order_by(orders.id.desc(), items.id)
+
+    # 参数错误在响应开始前报出来
+    order_date_range(*filters[:4])
+    return export_response("orders", fmt, ORDER_EXPORT_HEADER, query)
+
+
+@router.get("/batch", response_model=OrderBatch)
+async def get_orders_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="逗号分隔的订单号"),
+    fields: str | None = Query(None),
+    include_items: bool = Query(True),
+    database: Database = Depends(get_db),
+):
+    # 一次取多张订单：主库一条 IN 查询，订单项按批一起查；主库没有的再到覆盖其 id 的归档库里找
+    order_ids = parse_ids(ids)
+    shape, with_items = _order_shape(fields, include_items)
+    not_modified = await check_not_modified(request, response, database, "orders", "customers")
+    if not_modified:
+        return not_modified
+
+    def work(db: Session):
+        wanted = list(dict.fromkeys(order_ids))
+        rows = db.query(*shape.columns).filter(Order.id.in_(wanted)).all()
+        orders, plain = _order_dicts(db, rows, shape, with_items)
+        found = {order["id"]: order for order in orders}
+        missing = [order_id for order_id in wanted if order_id not in found]
+        years = years_holding(db, missing) if missing else []
+        if years:
+            archived, items = order_entities(db, years)
+            rows = db.query(*shape.columns_for(archived)).filter(archived.id.in_(missing)).all()
+            orders, archived_plain = _order_dicts(db, rows, shape, with_items, items)
+            found.update((order["id"], order) for order in orders)
+            plain = plain and archived_plain
+        return batch_result(order_ids, found), plain
+
+    result, plain = await database.run(work)
+    return FastJSONResponse(result, plain, headers=response.headers)
 
 
 @router.get("/{order_id}", response_model=OrderOut)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+async def get_order(order_id: int, database: Database = Depends(get_db)):
+    def work(db: Session):
+        order = db.query(Order).options(selectinload(Order.items)).filter(Order.id == order_id).first()
+        if order:
+            return order
+        # 不在主库时按归档目录的 id 范围找归档库（归档订单只读）
+        years = years_holding(db, [order_id])
+        if years:
+            orders, items = order_entities(db, years)
+            rows = db.query(*ORDER_ROW.columns_for(orders)).filter(orders.id == order_id).all()
+            if rows:
+                return _order_dicts(db, rows, ORDER_ROW, True, items)[0][0]
         raise HTTPException(status_code=404, detail="订单不存在")
-    return order
+
+    return await database.run(work)
+
+
+def _build_item(product: Product, item: OrderItemCreate) -> OrderItem:
+    return OrderItem(**line_values(product, item))
 
 
 @router.post("/", response_model=OrderOut)
-def create_order(payload: OrderCreate, db: Session = Depends(get_db)):
-    if not payload.items:
-        raise HTTPException(status_code=400, detail="订单至少包含一个商品")
-
-    order = Order(
-        customer_id=payload.customer_id,
-        customer_name=payload.customer_name,
-        customer_phone=payload.customer_phone,
-        customer_address=payload.customer_address,
-        status="未付款",
-    )
+async def create_order(payload: OrderCreate, database: Database = Depends(get_db)):
+    def work(db: Session):
+        if not payload.items:
+            raise HTTPException(status_code=400, detail="订单至少包含一个商品")
 
-    total = 0.0
-    for item in payload.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail=f"商品不存在: {item.product_id}")
-        if product.stock < item.quantity:
-            raise HTTPException(status_code=400, detail=f"库存不足: {product.name}")
-        price = getattr(item, "unit_price", None)
-        if price is None:
-            price = product.price
-        if price < 0:
-            raise HTTPException(status_code=400, detail=f"单价不合法: {price}")
-        subtotal = price * item.quantity
-        total += subtotal
-        unit = getattr(item, "unit", None) or "件"
-        if unit not in ("件", "斤"):
-            raise HTTPException(status_code=400, detail=f"单位不合法: {unit}")
-        order.items.append(OrderItem(
-            product_id=product.id,
-            product_name=product.name,
-            unit_price=price,
-            quantity=item.quantity,
-            unit=unit,
-            subtotal=subtotal,
-        ))
-        if unit != '斤':
-            product.stock -= item.quantity
-
-    # if selecting an existing customer, copy info; else create temp customer
-    if payload.customer_id:
-        customer = db.query(Customer).filter(Customer.id == payload.customer_id).first()
-        if customer:
-            order.customer = customer
-            if not order.customer_name:
-                order.customer_name = customer.name
-            if not order.customer_phone:
-                order.customer_phone = customer.phone
-            if not order.customer_address:
-                order.customer_address = customer.address
-    else:
-        name = payload.customer_name or "散客"
-        phone = payload.customer_phone or None
-        address = payload.customer_address or None
-        temp_cust = Customer(name=name, phone=phone, address=address)
-        db.add(temp_cust)
+        order = Order(
+            customer_id=payload.customer_id,
+            customer_name=payload.customer_name,
+            customer_phone=payload.customer_phone,
+            customer_address=payload.customer_address,
+            status="未付款",
+        )
+
+        reservation = StockReservation(db)
+        reservation.load(item.product_id for item in payload.items)
+        for item in payload.items:
+            line = _build_item(reservation.product(item.product_id), item)
+            reservation.take(line.product_id, line.quantity, line.unit)
+            order.items.append(line)
+        total = sum(line.subtotal for line in order.items)
+        reservation.apply()
+
+        # if selecting an existing customer, copy info; else create temp customer
+        if payload.customer_id:
+            customer = db.query(Customer).filter(Customer.id == payload.customer_id).first()
+            if customer:
+                order.customer = customer
+                if not order.customer_name:
+                    order.customer_name = customer.name
+                if not order.customer_phone:
+                    order.customer_phone = customer.phone
+                if not order.customer_address:
+                    order.customer_address = customer.address
+        else:
+            name = payload.customer_name or "散客"
+            phone = payload.customer_phone or None
+            address = payload.customer_address or None
+            temp_cust = Customer(name=name, phone=phone, address=address)
+            db.add(temp_cust)
+            db.flush()
+            # 按落库后的值推送（phone 为空时列默认值是 "无"）
+            stage(db, "customers", temp_cust.id, "create", name=temp_cust.name, phone=temp_cust.phone, address=temp_cust.address)
+            order.customer = temp_cust
+            order.customer_id = temp_cust.id
+            order.customer_name = temp_cust.name
+            order.customer_phone = temp_cust.phone
+            order.customer_address = temp_cust.address
+
+        order.total_amount = total
+        db.add(order)
         db.flush()
-        order.customer = temp_cust
-        order.customer_id = temp_cust.id
-        order.customer_name = temp_cust.name
-        order.customer_phone = temp_cust.phone
-        order.customer_address = temp_cust.address
+        reservation.record(REASON_ORDER, order.id)
+        stage(db, "orders", order.id, "create", **{name: getattr(order, name) for name in ORDER_EVENT_FIELDS})
+        db.commit()
+        invalidate_summary()
+        db.refresh(order)
+        return OrderOut.model_validate(order)
+
+    return await database.run(work)
+
+
+class _IngestResponse(StreamingResponse):
+    # 响应边读请求体边输出：不再另起任务监听断开（那个任务会调用 receive，把请求体的消息抢走），
+    # 客户端断开时读请求体会抛 ClientDisconnect，同样能停下来
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
 
-    order.total_amount = total
-    db.add(order)
-    db.commit()
-    db.refresh(order)
-    return order
+
+def _result_lines(results: list[dict]) -> str:
+    results.sort(key=lambda r: r["index"])
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results)
+
+
+@router.post("/bulk")
+async def bulk_create_orders(
+    request: Request,
+    chunk_size: int = Query(500, ge=1, le=5000),
+):
+    # 请求体为 NDJSON 或 JSON 数组，边读边校验，每 chunk_size 单批量写入并提交一次。
+    # 每批提交后立刻把这一批的结果（连同期间解析失败的行）按 index 顺序写回，客户端能看到进度，
+    # 内存只与 chunk_size 有关。响应头在处理开始前就已发出，状态码总是 200，逐行看 ok / error。
+    # 整批校验与组装较吃 CPU，用独立的同步会话放到线程池里执行，不占用事件循环
+
+    async def flush(chunk) -> list[dict]:
+        db = SessionLocal()
+        try:
+            results = await run_in_threadpool(ingest_chunk, db, chunk) if chunk else []
+        finally:
+            db.close()
+        if chunk:
+            invalidate_summary()
+        return results
+
+    async def lines():
+        # pending 为已读到、还没写回的解析失败结果；与 chunk 合计到 chunk_size 行就写回一次
+        pending: list[dict] = []
+        chunk = []
+        try:
+            async for index, payload, error in iter_order_payloads(request.stream()):
+                if error:
+                    pending.append({"index": index, "ok": False, "error": error})
+                else:
+                    chunk.append((index, payload))
+                if len(pending) + len(chunk) >= chunk_size:
+                    pending.extend(await flush(chunk))
+                    yield _result_lines(pending)
+                    pending, chunk = [], []
+        except ClientDisconnect:
+            # 客户端中途断开：已提交的批次保留，没读完的这一批丢弃
+            return
+        if pending or chunk:
+            pending.extend(await flush(chunk))
+            yield _result_lines(pending)
+
+    return _IngestResponse(lines(), media_type="application/x-ndjson")
 
 
 @router.post("/{order_id}/pay", response_model=OrderOut)
-def toggle_order_status(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    
-    if order.status == "已付款":
-        order.status = "未付款"
-    else:
-        order.status = "已付款"
-        
-    db.commit()
-    db.refresh(order)
-    return order
+async def toggle_order_status(order_id: int, database: Database = Depends(get_db)):
+    def work(db: Session):
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            raise HTTPException(status_code=404, detail="订单不存在")
 
+        if order.status == "已付款":
+            order.status = "未付款"
+        else:
+            order.status = "已付款"
 
-@router.put("/{order_id}", response_model=OrderOut)
-def update_order(order_id: int, payload: OrderCreate, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    
-    # 1. Restore stock for existing items
-    for item in order.items:
-        if item.unit != '斤':
-            product = db.query(Product).filter(Product.id == item.product_id).first()
-            if product:
-                product.stock += item.quantity
-    
-    # 2. Clear existing items
-    # Using cascade="all, delete-orphan" in model, so removing from list should work, 
-    # but explicit delete is safer to ensure stock logic was handled first (above).
-    # Actually, we just restored stock. Now we can clear the list.
-    order.items.clear()
-    
-    # 3. Update customer info
+        stage(db, "orders", order.id, "update", status=order.status)
+        db.commit()
+        invalidate_summary()
+        db.refresh(order)
+        return OrderOut.model_validate(order)
+
+    return await database.run(work)
+
+
+def _assign_customer(db: Session, order: Order, payload) -> None:
+    # 选了已有客户时带出其信息（客户不存在则不改），否则按手填的客户信息
     if payload.customer_id:
         customer = db.query(Customer).filter(Customer.id == payload.customer_id).first()
         if customer:
@@ -189,104 +492,169 @@ def update_order(order_id: int, payload: OrderCreate, db: Session = Depends(get_
         order.customer_name = payload.customer_name
         order.customer_phone = payload.customer_phone
         order.customer_address = payload.customer_address
-        
-    # 4. Add new items
-    total = 0.0
-    for item in payload.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail=f"商品不存在: {item.product_id}")
-        
-        # Check stock (now that we restored old stock, we are checking against available)
-        # Note: if product was in old order, its stock is back.
-        if item.unit != '斤' and product.stock < item.quantity:
-             # Rollback? The stock restoration is already done in memory but not committed? 
-             # No, we haven't committed yet. So product.stock in DB + restored amount?
-             # Wait, `product` object is from session. 
-             # If I updated `product.stock` in step 1, the session has the new value.
-             pass
-        
-        if item.unit != '斤':
-            if product.stock < item.quantity:
-                 raise HTTPException(status_code=400, detail=f"库存不足: {product.name} (剩余 {product.stock})")
-            product.stock -= item.quantity
-            
-        price = getattr(item, "unit_price", None)
-        if price is None:
-            price = product.price
-        if price < 0:
-            raise HTTPException(status_code=400, detail=f"单价不合法: {price}")
-            
-        subtotal = price * item.quantity
-        total += subtotal
-        unit = getattr(item, "unit", None) or "件"
-        if unit not in ("件", "斤"):
-            raise HTTPException(status_code=400, detail=f"单位不合法: {unit}")
-            
-        order.items.append(OrderItem(
-            product_id=product.id,
-            product_name=product.name,
-            unit_price=price,
-            quantity=item.quantity,
-            unit=unit,
-            subtotal=subtotal,
-        ))
-        
-    order.total_amount = total
-    db.commit()
-    db.refresh(order)
-    return order
 
 
-@router.post("/{order_id}/items", response_model=OrderOut)
-def add_order_item(order_id: int, payload: OrderItemCreate, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    product = db.query(Product).filter(Product.id == payload.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="商品不存在")
-    if product.stock < payload.quantity:
-        raise HTTPException(status_code=400, detail="库存不足")
-    unit = payload.unit or "件"
-    if unit not in ("件", "斤"):
-        raise HTTPException(status_code=400, detail="单位不合法")
-    price = payload.unit_price if payload.unit_price is not None else product.price
-    if price < 0:
-        raise HTTPException(status_code=400, detail="单价不合法")
-    subtotal = price * payload.quantity
-    item = OrderItem(
-        product_id=product.id,
-        product_name=product.name,
-        unit_price=price,
-        quantity=payload.quantity,
-        unit=unit,
-        subtotal=subtotal,
+def _edit_items(
+    db: Session,
+    reservation: StockReservation,
+    order_id: int,
+    changed: list[tuple[OrderItem, dict]],
+    removed: list[OrderItem],
+    added: list[dict],
+    reason: str = REASON_EDIT,
+) -> float:
+    # 只动有变化的订单项：新旧数量按商品轧差后库存一次生效，订单金额用一条 SQL 按订单项重算，不把订单项全部读回来。
+    # changed 为 (原订单项, 新的列值)，列值与原来相同的不会产生 UPDATE。返回新的订单金额
+    for item in removed:
+        reservation.give_back(item.product_id, item.quantity, item.unit)
+        db.delete(item)
+    for item, values in changed:
+        reservation.give_back(item.product_id, item.quantity, item.unit)
+        reservation.take(item.product_id, values["quantity"], values["unit"])
+        for key, value in values.items():
+            setattr(item, key, value)
+    for values in added:
+        reservation.take(values["product_id"], values["quantity"], values["unit"])
+        db.add(OrderItem(order_id=order_id, **values))
+    reservation.apply()
+    reservation.record(reason, order_id)
+    db.flush()
+    total = (
+        select(func.coalesce(func.sum(OrderItem.subtotal), 0.0))
+        .where(OrderItem.order_id == order_id)
+        .scalar_subquery()
     )
-    order.items.append(item)
-    if unit != '斤':
-        product.stock -= payload.quantity
-    order.total_amount = sum(i.subtotal for i in order.items)
-    db.commit()
-    db.refresh(order)
-    return order
+    return float(db.execute(
+        update(Order).where(Order.id == order_id).values(total_amount=total)
+        .returning(Order.total_amount)
+        .execution_options(synchronize_session=False)
+    ).scalar_one())
+
+
+@router.put("/{order_id}", response_model=OrderOut)
+async def update_order(order_id: int, payload: OrderCreate, database: Database = Depends(get_db)):
+    # 整单替换：新订单项按商品依次与原订单项配对，配上的原地更新，多出的新增，剩下的删除
+    def work(db: Session):
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            raise HTTPException(status_code=404, detail="订单不存在")
+
+        _assign_customer(db, order, payload)
+
+        reservation = StockReservation(db)
+        reservation.load([item.product_id for item in payload.items])
+        existing: dict[int, list[OrderItem]] = defaultdict(list)
+        for item in sorted(order.items, key=lambda i: i.id):
+            existing[item.product_id].append(item)
+        changed, added = [], []
+        for item in payload.items:
+            values = line_values(reservation.product(item.product_id), item)
+            if existing[item.product_id]:
+                changed.append((existing[item.product_id].pop(0), values))
+            else:
+                added.append(values)
+        removed = [item for items in existing.values() for item in items]
+        total = _edit_items(db, reservation, order.id, changed, removed, added)
+        customer = {name: getattr(order, name) for name in ORDER_CUSTOMER_FIELDS}
+        stage(db, "orders", order.id, "update", total_amount=total, **customer)
+
+        db.commit()
+        invalidate_summary()
+        db.refresh(order)
+        return OrderOut.model_validate(order)
+
+    return await database.run(work)
+
+
+@router.patch("/{order_id}", response_model=OrderOut)
+async def patch_order(order_id: int, payload: OrderPatch, database: Database = Depends(get_db)):
+    # 按行改单：只读出要改、要删的订单项，其余订单项不读不写
+    def work(db: Session):
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            raise HTTPException(status_code=404, detail="订单不存在")
+
+        touched = [change.id for change in payload.update] + payload.remove
+        if len(set(touched)) != len(touched):
+            raise HTTPException(status_code=400, detail="同一订单项在 update / remove 中只能出现一次")
+        items: dict[int, OrderItem] = {}
+        if touched:
+            items = {
+                item.id: item
+                for item in db.query(OrderItem).filter(OrderItem.order_id == order_id, OrderItem.id.in_(touched))
+            }
+            missing = [item_id for item_id in touched if item_id not in items]
+            if missing:
+                raise HTTPException(status_code=404, detail=f"订单项不存在: {', '.join(map(str, missing))}")
+
+        fields = payload.model_fields_set
+        if "customer_id" in fields:
+            _assign_customer(db, order, payload)
+        else:
+            for name in ("customer_name", "customer_phone", "customer_address"):
+                if name in fields:
+                    setattr(order, name, getattr(payload, name))
+
+        reservation = StockReservation(db)
+        reservation.load([item.product_id for item in payload.add])
+        added = [line_values(reservation.product(item.product_id), item) for item in payload.add]
+        changed = []
+        for change in payload.update:
+            item = items[change.id]
+            price = change.unit_price if change.unit_price is not None else item.unit_price
+            quantity = change.quantity if change.quantity is not None else item.quantity
+            unit = check_line(price, change.unit if change.unit is not None else item.unit)
+            changed.append((item, {"unit_price": price, "quantity": quantity, "unit": unit, "subtotal": price * quantity}))
+        total = _edit_items(db, reservation, order.id, changed, [items[item_id] for item_id in payload.remove], added)
+        # 改了客户时四个客户字段一起带上（选客户会带出其电话、地址）
+        customer = {
+            name: getattr(order, name)
+            for name in ORDER_CUSTOMER_FIELDS
+            if name in fields or "customer_id" in fields
+        }
+        stage(db, "orders", order.id, "update", total_amount=total, **customer)
+
+        db.commit()
+        invalidate_summary()
+        db.refresh(order)
+        return OrderOut.model_validate(order)
+
+    return await database.run(work)
+
+
+@router.post("/{order_id}/items", response_model=OrderOut)
+async def add_order_item(order_id: int, payload: OrderItemCreate, database: Database = Depends(get_db)):
+    def work(db: Session):
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            raise HTTPException(status_code=404, detail="订单不存在")
+        reservation = StockReservation(db)
+        values = line_values(reservation.product(payload.product_id), payload)
+        total = _edit_items(db, reservation, order.id, [], [], [values], REASON_ADD_ITEM)
+        stage(db, "orders", order.id, "update", total_amount=total)
+        db.commit()
+        invalidate_summary()
+        db.refresh(order)
+        return OrderOut.model_validate(order)
+
+    return await database.run(work)
 
 
 @router.delete("/{order_id}/items/{item_id}", response_model=OrderOut)
-def delete_order_item(order_id: int, item_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    item = db.query(OrderItem).filter(OrderItem.id == item_id, OrderItem.order_id == order_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="订单项不存在")
-    product = db.query(Product).filter(Product.id == item.product_id).first()
-    if product and item.unit != '斤':
-        product.stock += item.quantity
-    db.delete(item)
-    db.commit()
-    db.refresh(order)
-    order.total_amount = sum(i.subtotal for i in order.items)
-    db.commit()
-    db.refresh(order)
-    return order
+async def delete_order_item(order_id: int, item_id: int, database: Database = Depends(get_db)):
+    def work(db: Session):
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            raise HTTPException(status_code=404, detail="订单不存在")
+        item = db.query(OrderItem).filter(OrderItem.id == item_id, OrderItem.order_id == order_id).first()
+        if not item:
+            raise HTTPException(status_code=404, detail="订单项不存在")
+        reservation = StockReservation(db)
+        total = _edit_items(db, reservation, order.id, [], [item], [], REASON_DELETE_ITEM)
+        stage(db, "orders", order.id, "update", total_amount=total)
+        db.commit()
+        invalidate_summary()
+        db.refresh(order)
+        return OrderOut.model_validate(order)
+
+    return await database.run(work)
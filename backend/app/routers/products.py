@@ -1,93 +1,248 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from ..database import SessionLocal
+from ..database import Database, SessionLocal, get_db
 from ..models import Product
-from ..schemas import ProductCreate, ProductUpdate, ProductOut, ProductPage
+from ..schemas import ProductBatch, ProductCreate, ProductUpdate, ProductOut, ProductPage, ProductImportResult, StockAt
 from ..auth import get_current_user
+from ..pagination import paginate
+from ..search import fts_search
+from ..versions import check_not_modified
+from ..serialization import FastJSONResponse, RowShape, batch_result, parse_fields, parse_ids
+from ..exporting import export_response
+from ..events import stage
+from ..ingest import import_products
+from ..inventory import REASON_ADJUST, REASON_CREATE, record_movements, record_stock_set, stock_at
+from .stats import invalidate_summary
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+PRODUCT_ROW = RowShape(ProductOut, Product)
+
+
+def _product_fields(product: Product, names) -> dict:
+    return {name: getattr(product, name) for name in names if name != "id"}
 
 
 router = APIRouter(prefix="/products", tags=["商品"], dependencies=[Depends(get_current_user)])
 
 
 @router.get("/", response_model=list[ProductOut])
-def list_products(
+async def list_products(
+    request: Request,
+    response: Response,
     page: int | None = Query(None, ge=1),
     page_size: int | None = Query(None, ge=1, le=200),
-    db: Session = Depends(get_db),
+    fields: str | None = Query(None),
+    database: Database = Depends(get_db),
 ):
-    q = db.query(Product).order_by(Product.id.desc())
-    if page and page_size:
-        return q.offset((page - 1) * page_size).limit(page_size).all()
-    return q.all()
+    shape = PRODUCT_ROW.only(parse_fields(fields))
+    not_modified = await check_not_modified(request, response, database, "products")
+    if not_modified:
+        return not_modified
 
+    def work(db: Session):
+        q = db.query(*shape.columns).order_by(Product.id.desc())
+        if page and page_size:
+            q = q.offset((page - 1) * page_size).limit(page_size)
+        return shape.dump(q.all())
 
-@router.post("/", response_model=ProductOut)
-def create_product(payload: ProductCreate, db: Session = Depends(get_db)):
-    if payload.sku and payload.sku != "无":
-        exist = db.query(Product).filter(Product.sku == payload.sku).first()
-        if exist:
-            raise HTTPException(status_code=400, detail="SKU已存在")
+    items, plain = await database.run(work)
+    return FastJSONResponse(items, plain, headers=response.headers)
 
-    product = Product(**payload.model_dump())
-    if not product.sku:
-        product.sku = "无"
-    if not product.original_weight:
-        product.original_weight = "无"
 
-    db.add(product)
-    db.commit()
-    db.refresh(product)
-    return product
+@router.post("/", response_model=ProductOut)
+async def create_product(payload: ProductCreate, database: Database = Depends(get_db)):
+    def work(db: Session):
+        if payload.sku and payload.sku != "无":
+            exist = db.query(Product).filter(Product.sku == payload.sku).first()
+            if exist:
+                raise HTTPException(status_code=400, detail="SKU已存在")
+
+        product = Product(**payload.model_dump())
+        if not product.sku:
+            product.sku = "无"
+        if not product.original_weight:
+            product.original_weight = "无"
+
+        db.add(product)
+        db.flush()
+        record_movements(db, [(product.id, product.stock, None)], REASON_CREATE)
+        stage(db, "products", product.id, "create", **_product_fields(product, PRODUCT_ROW.fields))
+        db.commit()
+        invalidate_summary()
+        db.refresh(product)
+        return product
+
+    return await database.run(work)
 
 
 @router.put("/{product_id}", response_model=ProductOut)
-def update_product(product_id: int, payload: ProductUpdate, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="商品不存在")
-
-    if payload.sku and payload.sku != "无" and payload.sku != product.sku:
-        exist = db.query(Product).filter(Product.sku == payload.sku).first()
-        if exist:
-            raise HTTPException(status_code=400, detail="SKU已存在")
+async def update_product(product_id: int, payload: ProductUpdate, database: Database = Depends(get_db)):
+    def work(db: Session):
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="商品不存在")
+
+        if payload.sku and payload.sku != "无" and payload.sku != product.sku:
+            exist = db.query(Product).filter(Product.sku == payload.sku).first()
+            if exist:
+                raise HTTPException(status_code=400, detail="SKU已存在")
+
+        changes = payload.model_dump(exclude_unset=True)
+        if changes.get("stock") is not None:
+            # 库存被直接改写：在 UPDATE 之前按新旧差额记一笔调整
+            record_stock_set(db, [{"id": product.id, "stock": changes["stock"]}], REASON_ADJUST)
+        for k, v in changes.items():
+            setattr(product, k, v)
+
+        if not product.sku:
+            product.sku = "无"
+        if not product.original_weight:
+            product.original_weight = "无"
+
+        stage(db, "products", product.id, "update", **_product_fields(product, changes))
+        db.commit()
+        invalidate_summary()
+        db.refresh(product)
+        return product
+
+    return await database.run(work)
 
-    for k, v in payload.model_dump(exclude_unset=True).items():
-        setattr(product, k, v)
 
-    if not product.sku:
-        product.sku = "无"
-    if not product.original_weight:
-        product.original_weight = "无"
+@router.delete("/{product_id}")
+async def delete_product(product_id: int, database: Database = Depends(get_db)):
+    def work(db: Session):
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="商品不存在")
+        db.delete(product)
+        stage(db, "products", product_id, "delete")
+        db.commit()
+        invalidate_summary()
+        return {"message": "已删除"}
 
-    db.commit()
-    db.refresh(product)
-    return product
+    return await database.run(work)
 
 
-@router.delete("/{product_id}")
-def delete_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="商品不存在")
-    db.delete(product)
-    db.commit()
-    return {"message": "已删除"}
 @router.get("/page", response_model=ProductPage)
-def list_products_paged(
+async def list_products_paged(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=200),
-    db: Session = Depends(get_db),
+    after_id: int | None = Query(None),
+    before_id: int | None = Query(None),
+    cursor: str | None = Query(None),
+    q: str | None = Query(None),
+    with_total: bool = Query(True),
+    fields: str | None = Query(None),
+    database: Database = Depends(get_db),
+):
+    shape = PRODUCT_ROW.only(parse_fields(fields))
+    not_modified = await check_not_modified(request, response, database, "products")
+    if not_modified:
+        return not_modified
+
+    q = q.strip() if q else None
+
+    def work(db: Session):
+        query = db.query(*shape.columns)
+        order_by = None
+        if q:
+            hits = fts_search("products", q)
+            query = query.join(hits, hits.c.id == Product.id)
+            order_by = (hits.c.rank, Product.id.desc())
+        result = paginate(query, Product.id, ("products", q), page, page_size, after_id, before_id, cursor, with_total, order_by)
+        result["items"], plain = shape.dump(result["items"])
+        return result, plain
+
+    result, plain = await database.run(work)
+    return FastJSONResponse(result, plain, headers=response.headers)
+
+
+@router.get("/batch", response_model=ProductBatch)
+async def get_products_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="逗号分隔的商品 id"),
+    fields: str | None = Query(None),
+    database: Database = Depends(get_db),
 ):
-    q = db.query(Product).order_by(Product.id.desc())
-    total = q.count()
-    items = q.offset((page - 1) * page_size).limit(page_size).all()
-    return {"items": items, "total": total, "page": page, "page_size": page_size}
+    # 按 id 一次取多条，结果与 ids 顺序一致，查不到的为 null
+    product_ids = parse_ids(ids)
+    shape = PRODUCT_ROW.only(parse_fields(fields))
+    not_modified = await check_not_modified(request, response, database, "products")
+    if not_modified:
+        return not_modified
+
+    def work(db: Session):
+        rows = db.query(*shape.columns).filter(Product.id.in_(list(dict.fromkeys(product_ids)))).all()
+        items, plain = shape.dump(rows)
+        return batch_result(product_ids, {item["id"]: item for item in items}), plain
+
+    result, plain = await database.run(work)
+    return FastJSONResponse(result, plain, headers=response.headers)
+
+
+@router.get("/{product_id}/stock", response_model=StockAt)
+async def product_stock_at(
+    product_id: int,
+    at: str | None = Query(None),
+    database: Database = Depends(get_db),
+):
+    # at: "2026-09-30"（当天结束时）或 "2026-09-30 12:00:00"，按 UTC；不传时为当前
+    if at:
+        try:
+            when = datetime.strptime(at.strip(), "%Y-%m-%d") + timedelta(days=1) - timedelta(microseconds=1)
+        except ValueError:
+            try:
+                when = datetime.strptime(at.strip(), "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"时间格式不合法: {at}")
+    else:
+        when = datetime.utcnow()
+
+    def work(db: Session):
+        if not db.query(Product.id).filter(Product.id == product_id).first():
+            raise HTTPException(status_code=404, detail="商品不存在")
+        return stock_at(db, product_id, when)
+
+    return await database.run(work)
+
+
+PRODUCT_EXPORT_HEADER = ["ID", "名称", "SKU", "单价", "库存", "描述", "原重"]
+
+
+@router.get("/export")
+def export_products(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    q: str | None = Query(None),
+):
+    stmt = select(
+        Product.id, Product.name, Product.sku, Product.price, Product.stock,
+        Product.description, Product.original_weight,
+    ).order_by(Product.id.desc())
+    if q and q.strip():
+        hits = fts_search("products", q.strip())
+        stmt = stmt.join(hits, hits.c.id == Product.id)
+    return export_response("products", fmt, PRODUCT_EXPORT_HEADER, stmt)
+
+
+# 批量导入以解析 CSV 为主，保持同步接口在线程池里跑，不占用事件循环
+@router.post("/import", response_model=ProductImportResult)
+def import_products_csv(
+    file: UploadFile = File(...),
+    dry_run: bool = Query(False),
+    batch_size: int = Query(500, ge=1, le=5000),
+):
+    db = SessionLocal()
+    try:
+        result = import_products(db, file.file, dry_run, batch_size)
+    finally:
+        db.close()
+    if not dry_run:
+        invalidate_summary()
+    return result
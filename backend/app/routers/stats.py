@@ -0,0 +1,75 @@
+import time
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..database import Database, get_db
+from ..models import Customer, DailySales, Product
+from ..schemas import StatsSummary
+from ..auth import get_current_user
+
+
+router = APIRouter(prefix="/stats", tags=["统计"], dependencies=[Depends(get_current_user)])
+
+# 汇总结果短暂缓存，商品/客户/订单写接口提交后会主动失效；
+# 只缓存默认阈值（首页看板用的就是它），其他阈值每次现查，缓存不会被随意的 query 参数撑大
+SUMMARY_CACHE_TTL = 10
+DEFAULT_LOW_STOCK_THRESHOLD = 10
+_summary_cache: dict[float, tuple[float, dict]] = {}
+
+
+def invalidate_summary() -> None:
+    _summary_cache.clear()
+
+
+def _build_summary(db: Session, low_stock_threshold: float) -> dict:
+    # 订单数和金额读销售汇总表：不扫订单表，也包含已归档的订单
+    by_status = db.query(
+        DailySales.status,
+        func.sum(DailySales.order_count),
+        func.coalesce(func.sum(DailySales.revenue), 0.0),
+    ).group_by(DailySales.status).having(func.sum(DailySales.order_count) != 0).order_by(DailySales.status).all()
+
+    today_count, today_revenue = db.query(
+        func.coalesce(func.sum(DailySales.order_count), 0),
+        func.coalesce(func.sum(DailySales.revenue), 0.0),
+    ).filter(DailySales.day == datetime.utcnow().strftime("%Y-%m-%d")).one()
+
+    product_count, low_stock_count = db.query(
+        func.count(Product.id),
+        func.coalesce(func.sum(Product.stock <= low_stock_threshold), 0),
+    ).one()
+    customer_count = db.query(func.count(Customer.id)).scalar()
+
+    unpaid = [row for row in by_status if row[0] == "未付款"]
+    return {
+        "product_count": product_count,
+        "customer_count": customer_count,
+        "order_count": sum(row[1] for row in by_status),
+        "total_sales": sum(row[2] for row in by_status),
+        "today_order_count": today_count,
+        "today_revenue": today_revenue,
+        "unpaid_count": unpaid[0][1] if unpaid else 0,
+        "unpaid_amount": unpaid[0][2] if unpaid else 0.0,
+        "low_stock_count": low_stock_count,
+        "low_stock_threshold": low_stock_threshold,
+        "by_status": [{"status": s, "count": c, "amount": a} for s, c, a in by_status],
+    }
+
+
+@router.get("/summary", response_model=StatsSummary)
+async def summary(
+    low_stock_threshold: float = Query(DEFAULT_LOW_STOCK_THRESHOLD, ge=0),
+    database: Database = Depends(get_db),
+):
+    if low_stock_threshold != DEFAULT_LOW_STOCK_THRESHOLD:
+        return await database.run(_build_summary, low_stock_threshold)
+    now = time.monotonic()
+    hit = _summary_cache.get(low_stock_threshold)
+    if hit and hit[0] > now:
+        return hit[1]
+    data = await database.run(_build_summary, low_stock_threshold)
+    _summary_cache[low_stock_threshold] = (now + SUMMARY_CACHE_TTL, data)
+    return data
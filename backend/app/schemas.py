@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -55,6 +55,21 @@ class ProductOut(ProductBase):
         from_attributes = True
 
 
+class ImportRowError(BaseModel):
+    row: int
+    sku: Optional[str] = None
+    error: str
+
+
+class ProductImportResult(BaseModel):
+    dry_run: bool
+    total: int
+    inserted: int
+    updated: int
+    failed: int
+    errors: List[ImportRowError]
+
+
 class CustomerBase(BaseModel):
     name: str
     phone: Optional[str] = "无"
@@ -93,6 +108,24 @@ class OrderCreate(BaseModel):
     items: List[OrderItemCreate]
 
 
+class OrderItemPatch(BaseModel):
+    id: int
+    quantity: Optional[float] = None
+    unit_price: Optional[float] = None
+    unit: Optional[str] = None
+
+
+class OrderPatch(BaseModel):
+    # 只传要改的部分：客户字段只改出现的；add 新增订单项，update 改已有订单项的数量/单价/单位，remove 删除订单项
+    customer_id: Optional[int] = None
+    customer_name: Optional[str] = None
+    customer_phone: Optional[str] = None
+    customer_address: Optional[str] = None
+    add: List[OrderItemCreate] = []
+    update: List[OrderItemPatch] = []
+    remove: List[int] = []
+
+
 class OrderItemOut(BaseModel):
     id: int
     product_id: int
@@ -123,20 +156,100 @@ class OrderOut(BaseModel):
 
 class ProductPage(BaseModel):
     items: List[ProductOut]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 
 class CustomerPage(BaseModel):
     items: List[CustomerOut]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 
 class OrderPage(BaseModel):
     items: List[OrderOut]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class ProductBatch(BaseModel):
+    items: List[Optional[ProductOut]]
+    not_found: List[int]
+
+
+class CustomerBatch(BaseModel):
+    items: List[Optional[CustomerOut]]
+    not_found: List[int]
+
+
+class OrderBatch(BaseModel):
+    items: List[Optional[OrderOut]]
+    not_found: List[int]
+
+
+class SyncRows(BaseModel):
+    columns: List[str]
+    rows: List[list]
+
+
+class SyncBatch(BaseModel):
+    since: int
+    version: int
+    has_more: bool
+    changes: Dict[str, SyncRows]
+    deleted: Dict[str, List[int]]
+
+
+class StatusTotal(BaseModel):
+    status: str
+    count: int
+    amount: float
+
+
+class StatsSummary(BaseModel):
+    product_count: int
+    customer_count: int
+    order_count: int
+    total_sales: float
+    today_order_count: int
+    today_revenue: float
+    unpaid_count: int
+    unpaid_amount: float
+    low_stock_count: int
+    low_stock_threshold: float
+    by_status: List[StatusTotal]
+
+
+class SalesRow(BaseModel):
+    key: str
+    name: Optional[str] = None
+    order_count: Optional[int] = None
+    line_count: Optional[int] = None
+    quantity: Optional[float] = None
+    revenue: float
+
+
+class SalesReport(BaseModel):
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    group_by: str
+    status: Optional[str] = None
+    total_revenue: float
+    rows: List[SalesRow]
+
+
+class StockAt(BaseModel):
+    product_id: int
+    at: datetime
+    stock: float
+    snapshot_at: Optional[datetime] = None
+    movements_scanned: int
@@ -0,0 +1,68 @@
+from sqlalchemy import Float, Integer, text
+
+
+# 全文检索：products_fts / customers_fts 为 external content 的 FTS5 表，
+# trigram 分词可直接检索中文子串，由触发器与主表保持同步
+FTS_TABLES = {
+    "products": ("name", "sku", "description"),
+    "customers": ("name", "phone", "address"),
+}
+
+# trigram 至少需要 3 个字符才能走索引，更短的词退化为 FTS 表上的 LIKE
+MIN_MATCH_LENGTH = 3
+
+
+def _fts_ddl(table: str, columns: tuple[str, ...]) -> list[str]:
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END""",
+    ]
+
+
+def ensure_fts_tables(conn) -> None:
+    for table, columns in FTS_TABLES.items():
+        fts = f"{table}_fts"
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+        ).first()
+        for ddl in _fts_ddl(table, columns):
+            conn.exec_driver_sql(ddl)
+        if not exists:
+            # 新建索引时把已有数据灌进去
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# 返回 (id, rank) 子查询：每个以空白分隔的词都必须命中；rank 越小越相关
+def fts_search(table: str, q: str):
+    fts = f"{table}_fts"
+    terms = q.split()
+    long_terms = [t for t in terms if len(t) >= MIN_MATCH_LENGTH]
+    short_terms = [t for t in terms if len(t) < MIN_MATCH_LENGTH]
+
+    clauses, params = [], {}
+    if long_terms:
+        clauses.append(f"{fts} MATCH :match")
+        params["match"] = " ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+    for i, term in enumerate(short_terms):
+        clauses.append("(" + " OR ".join(f"{c} LIKE :t{i} ESCAPE '\\'" for c in FTS_TABLES[table]) + ")")
+        params[f"t{i}"] = f"%{_escape_like(term)}%"
+    rank = "rank" if long_terms else "0.0"
+    stmt = text(f"SELECT rowid AS id, {rank} AS rank FROM {fts} WHERE " + " AND ".join(clauses))
+    return stmt.bindparams(**params).columns(id=Integer, rank=Float).subquery(f"{fts}_hits")
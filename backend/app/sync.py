@@ -0,0 +1,149 @@
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.orm import Session
+
+from .auth import get_current_user
+from .database import Database, get_db
+from .models import Customer, Order, OrderItem, Product
+from .reports import ARCHIVE_GUARD
+from .schemas import SyncBatch
+from .serialization import FastJSONResponse
+
+
+# 增量同步：商品、客户、订单、订单项每行带一个 row_version，取自全库唯一递增的 sync_clock，
+# 由触发器在插入 / 更新时写入（批量导入、扣库存等不经过 ORM 的写入同样会更新）；删除的行在 sync_tombstones 里留一条记录。
+# 客户端保存上次返回的 version，下次带 since=<version> 只拿这之后改过和删掉的行：
+#   GET /sync?since=0                  # 首次全量，has_more 为 true 时带返回的 version 接着取
+#   GET /sync?since=<version>          # 之后只取变化
+# 同一个 version 只能配同一组 entities 使用。已归档的订单不在同步范围内（搬走时不留删除记录）
+SYNC_TABLES = {
+    "products": Product.__table__,
+    "customers": Customer.__table__,
+    "orders": Order.__table__,
+    "order_items": OrderItem.__table__,
+}
+SYNC_BATCH_SIZE = 1000
+MAX_SYNC_BATCH_SIZE = 5000
+
+
+def _sync_ddl(table: str) -> list[str]:
+    bump = "UPDATE sync_clock SET version = version + 1;"
+    stamp = f"UPDATE {table} SET row_version = (SELECT version FROM sync_clock) WHERE id = new.id;"
+    # 归档搬走的订单 / 订单项不算删除
+    guard = ARCHIVE_GUARD if table in ("orders", "order_items") else ""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_sync_ai AFTER INSERT ON {table} BEGIN
+            {bump} {stamp}
+            DELETE FROM sync_tombstones WHERE entity = '{table}' AND row_id = new.id;
+        END""",
+        # 触发器自己写 row_version 时 WHEN 不成立，不会再套一层
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_sync_au AFTER UPDATE ON {table}
+            WHEN new.row_version = old.row_version BEGIN {bump} {stamp} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_sync_ad AFTER DELETE ON {table} {guard} BEGIN
+            {bump}
+            INSERT OR REPLACE INTO sync_tombstones (entity, row_id, row_version)
+            VALUES ('{table}', old.id, (SELECT version FROM sync_clock));
+        END""",
+    ]
+
+
+def ensure_sync_tables(conn) -> None:
+    # row_version 列由 create_all / 迁移补好；时钟表首次创建时（老库升级）给已有的行按 id 依次编号
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_clock'"
+    ).first()
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_clock (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+    )
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_tombstones (entity VARCHAR(20) NOT NULL, row_id INTEGER NOT NULL, "
+        "row_version INTEGER NOT NULL, PRIMARY KEY (entity, row_id))"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_sync_tombstones_row_version ON sync_tombstones (row_version)"
+    )
+    if not exists:
+        # 起点取建表时刻（毫秒），数据库重建后客户端手里的旧 version 不会与新库的撞上；
+        # 编号要在建触发器之前做，否则每行都会再走一遍触发器
+        version = int(time.time() * 1000)
+        for table in SYNC_TABLES:
+            conn.exec_driver_sql(f"UPDATE {table} SET row_version = ? + id", (version,))
+            version += conn.exec_driver_sql(f"SELECT COALESCE(MAX(id), 0) FROM {table}").scalar()
+        conn.exec_driver_sql("INSERT INTO sync_clock (id, version) VALUES (1, ?)", (version,))
+    for table in SYNC_TABLES:
+        for ddl in _sync_ddl(table):
+            conn.exec_driver_sql(ddl)
+
+
+def changes_since(db: Session, entities: tuple[str, ...], since: int, limit: int) -> dict:
+    # 按 row_version 从小到大取最多 limit 行（改动与删除合计），各表都在同一个读事务里查
+    clock = db.execute(text("SELECT version FROM sync_clock")).scalar_one()
+    if since > clock:
+        # 客户端的 version 比库里的还新：数据库被重建或从备份恢复过，增量已经接不上
+        raise HTTPException(status_code=410, detail="同步版本已失效，请从 since=0 重新全量同步")
+    # (版本号, 实体, 改动的整行 tuple 或删除的 id)
+    found: list[tuple[int, str, tuple | int]] = []
+    truncated = False
+    for entity in entities:
+        table = SYNC_TABLES[entity]
+        rows = db.execute(
+            select(table).where(table.c.row_version > since).order_by(table.c.row_version).limit(limit)
+        ).all()
+        truncated |= len(rows) == limit
+        found.extend((row.row_version, entity, tuple(row)) for row in rows)
+    if since:
+        # 从 0 开始的全量同步用不着删除记录
+        rows = db.execute(
+            text(
+                "SELECT row_version, entity, row_id FROM sync_tombstones "
+                "WHERE row_version > :since AND entity IN :entities ORDER BY row_version LIMIT :limit"
+            ).bindparams(bindparam("entities", expanding=True)),
+            {"since": since, "entities": list(entities), "limit": limit},
+        ).all()
+        truncated |= len(rows) == limit
+        found.extend((version, entity, row_id) for version, entity, row_id in rows)
+    found.sort(key=lambda item: item[0])
+    has_more = truncated or len(found) > limit
+    found = found[:limit]
+
+    changes = {entity: {"columns": list(SYNC_TABLES[entity].c.keys()), "rows": []} for entity in entities}
+    deleted: dict[str, list[int]] = {entity: [] for entity in entities}
+    for _, entity, row in found:
+        if isinstance(row, tuple):
+            changes[entity]["rows"].append(row)
+        else:
+            deleted[entity].append(row)
+    return {
+        "since": since,
+        # 没取完时是这一批最后一行的版本号，取完了就是当前时钟，客户端下次从这里接着取
+        "version": found[-1][0] if has_more else clock,
+        "has_more": has_more,
+        "changes": {entity: batch for entity, batch in changes.items() if batch["rows"]},
+        "deleted": {entity: ids for entity, ids in deleted.items() if ids},
+    }
+
+
+def _parse_entities(value: str | None) -> tuple[str, ...]:
+    if not value:
+        return tuple(SYNC_TABLES)
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(SYNC_TABLES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知实体: {', '.join(sorted(unknown))}")
+    return tuple(name for name in SYNC_TABLES if name in names) or tuple(SYNC_TABLES)
+
+
+router = APIRouter(tags=["增量同步"], dependencies=[Depends(get_current_user)])
+
+
+@router.get("/sync", response_model=SyncBatch)
+async def sync(
+    since: int = Query(0, ge=0, description="上次同步返回的 version；0 为全量"),
+    limit: int = Query(SYNC_BATCH_SIZE, ge=1, le=MAX_SYNC_BATCH_SIZE, description="本批最多返回多少行（改动与删除合计）"),
+    entities: str | None = Query(None, description="逗号分隔：products,customers,orders,order_items；不传为全部"),
+    database: Database = Depends(get_db),
+):
+    wanted = _parse_entities(entities)
+    return FastJSONResponse(await database.run(changes_since, wanted, since, limit))
@@ -0,0 +1,67 @@
+import time
+
+from fastapi import Request, Response
+from sqlalchemy import bindparam, text
+
+
+# 每张业务表一个版本号，由触发器在同一事务里递增：多个 worker 共用同一个 SQLite 文件时也一致，
+# 批量导入、下单扣库存等不经过 ORM 的写入同样会被计入。订单项的变动计入 orders
+VERSIONED_TABLES = {
+    "products": ("products",),
+    "customers": ("customers",),
+    "orders": ("orders", "order_items"),
+}
+
+
+def _version_ddl(name: str, table: str) -> list[str]:
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE name = '{name}';"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_{event[0]} AFTER {event} ON {table} BEGIN {bump} END"
+        for event in ("INSERT", "UPDATE", "DELETE")
+    ]
+
+
+def ensure_version_table(conn) -> None:
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS table_versions (name VARCHAR(50) PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    # 初始值取建表时刻（毫秒），数据库重建后不会与浏览器里缓存的旧 ETag 撞号
+    start = int(time.time() * 1000)
+    for name, tables in VERSIONED_TABLES.items():
+        conn.exec_driver_sql("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, ?)", (name, start))
+        for table in tables:
+            for ddl in _version_ddl(name, table):
+                conn.exec_driver_sql(ddl)
+
+
+def table_versions(db, names: tuple[str, ...]) -> dict[str, int]:
+    stmt = text("SELECT name, version FROM table_versions WHERE name IN :names").bindparams(
+        bindparam("names", expanding=True)
+    )
+    return dict(db.execute(stmt, {"names": list(names)}).all())
+
+
+def make_etag(versions: dict[str, int]) -> str:
+    return '"' + "-".join(f"{name}.{version}" for name, version in sorted(versions.items())) + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match 按弱比较：忽略 W/ 前缀，"*" 匹配任意版本
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# 列表接口在查询前调用：版本未变时直接返回 304，否则把 ETag 写进响应头并返回 None
+async def check_not_modified(request: Request, response: Response, database, *names: str) -> Response | None:
+    versions = await database.run(table_versions, names)
+    etag = make_etag({name: versions.get(name, 0) for name in names})
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
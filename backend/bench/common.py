@@ -0,0 +1,66 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# 各压测脚本共用：延迟分位数、被测服务的启动与登录
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def summarize(latencies: list[float], seconds: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, cwd: str | None = None, workers: int = 1) -> subprocess.Popen:
+    # 服务端单独起进程，压测线程不和它抢 GIL；数据库是 cwd 下的 jinxiaocun.db
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+        cwd=cwd,
+    )
+    base = f"http://127.0.0.1:{port}"
+    # 老库首次启动要跑迁移（重建全文索引、汇总表），给足时间
+    for _ in range(3000):
+        if proc.poll() is not None:
+            break
+        try:
+            requests.get(f"{base}/", timeout=1)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("服务启动失败")
+
+
+def login(base: str, session: requests.Session) -> str:
+    r = session.post(f"{base}/auth/login", data={"username": "admin", "password": "admin"})
+    r.raise_for_status()
+    return r.json()["access_token"]
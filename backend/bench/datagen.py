@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert
+
+from app.database import Base
+from app.migrations import migrate
+from app.models import Customer, Order, OrderItem, Product
+
+
+# 压测用的合成数据：按模型直接批量写入 N 个商品、客户和带订单项的订单，同一个 --seed 生成的数据完全相同。
+# 先只建表、灌数据，再跑迁移：全文索引、销售汇总、库存期初都由迁移按整表一次性建出来，不用逐行走触发器
+#   cd backend && python -m bench.datagen /tmp/jxc-1m/jinxiaocun.db --orders 1000000
+# 生成的库可以直接交给 bench.scenarios --db 使用
+
+# 只用下单接口接受的单位（app.ingest.UNITS）：改单场景会把生成的订单项原样提交回去，不合法的单位只会测到 400
+UNITS = ("件", "件", "件", "斤")
+PAID_RATIO = 0.7
+
+
+def _chunks(total: int, size: int):
+    for start in range(0, total, size):
+        yield start, min(total, start + size)
+
+
+def _pick(rng: random.Random, n: int) -> int:
+    # 1..n 均匀取一个；比 randint 快几倍，百万级订单时差得出来
+    return int(rng.random() * n) + 1
+
+
+def generate(
+    path: str,
+    products: int,
+    customers: int,
+    orders: int,
+    items: tuple[int, int] = (1, 5),
+    days: int = 365,
+    seed: int = 42,
+    chunk: int = 50_000,
+) -> dict:
+    engine = create_engine(f"sqlite:///{path}")
+
+    # 灌数据期间不等落盘；库是一次性生成的，中途失败重来即可
+    @event.listens_for(engine, "connect")
+    def _fast_pragmas(dbapi_conn, _):
+        dbapi_conn.execute("PRAGMA synchronous = OFF")
+        dbapi_conn.execute("PRAGMA journal_mode = MEMORY")
+
+    rng = random.Random(seed)
+    timings = {}
+    started = time.perf_counter()
+    Base.metadata.create_all(engine)
+
+    prices = [round(rng.uniform(1, 200), 2) for _ in range(products)]
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"id": i + 1, "name": f"商品{i + 1}", "sku": f"SKU-{i + 1:07d}", "price": prices[i],
+             "stock": 1_000_000.0, "description": f"描述{i + 1}" if i % 3 == 0 else None, "original_weight": "无"}
+            for i in range(products)
+        ])
+        conn.execute(insert(Customer), [
+            {"id": i + 1, "name": f"客户{i + 1}", "phone": f"138{i + 1:08d}", "address": f"某市某区{i % 500 + 1}号"}
+            for i in range(customers)
+        ])
+    timings["products_customers_s"] = round(time.perf_counter() - started, 2)
+
+    # 订单按 id 递增均匀铺在最近 days 天里，与真实数据一样 id 越大越新
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    step = (end - start).total_seconds() / max(orders, 1)
+    item_id = 0
+    item_count = 0
+    t = time.perf_counter()
+    for lo, hi in _chunks(orders, chunk):
+        order_rows, item_rows = [], []
+        for i in range(lo, hi):
+            order_id = i + 1
+            customer_id = _pick(rng, customers) if customers else None
+            total = 0.0
+            for _ in range(items[0] - 1 + _pick(rng, items[1] - items[0] + 1)):
+                item_id += 1
+                pid = _pick(rng, products)
+                quantity = float(_pick(rng, 5))
+                subtotal = round(prices[pid - 1] * quantity, 2)
+                total += subtotal
+                item_rows.append({
+                    "id": item_id, "order_id": order_id, "product_id": pid, "product_name": f"商品{pid}",
+                    "unit_price": prices[pid - 1], "quantity": quantity, "unit": UNITS[pid % len(UNITS)],
+                    "subtotal": subtotal,
+                })
+            order_rows.append({
+                "id": order_id,
+                "created_at": start + timedelta(seconds=int(i * step)),
+                "customer_id": customer_id,
+                "customer_name": f"客户{customer_id}" if customer_id else None,
+                "customer_phone": f"138{customer_id:08d}" if customer_id else None,
+                "customer_address": f"某市某区{(customer_id - 1) % 500 + 1}号" if customer_id else None,
+                "total_amount": round(total, 2),
+                "status": "已付款" if rng.random() < PAID_RATIO else "未付款",
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Order), order_rows)
+            conn.execute(insert(OrderItem), item_rows)
+        item_count += len(item_rows)
+    timings["orders_s"] = round(time.perf_counter() - t, 2)
+
+    t = time.perf_counter()
+    migrate(engine)
+    timings["migrate_s"] = round(time.perf_counter() - t, 2)
+    engine.dispose()
+
+    timings["total_s"] = round(time.perf_counter() - started, 2)
+    return {
+        "path": os.path.abspath(path),
+        "seed": seed,
+        "products": products,
+        "customers": customers,
+        "orders": orders,
+        "order_items": item_count,
+        "size_mb": round(os.path.getsize(path) / 1e6, 1),
+        **timings,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="生成的 SQLite 文件；服务按当前目录下的 jinxiaocun.db 读库，建议就叫这个名字")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--items", type=int, nargs=2, default=(1, 5), metavar=("MIN", "MAX"), help="每单订单项数范围")
+    parser.add_argument("--days", type=int, default=365, help="订单时间跨度（天）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="文件已存在时覆盖")
+    args = parser.parse_args()
+
+    if args.products < 1:
+        parser.error("--products 至少为 1")
+    if not 1 <= args.items[0] <= args.items[1]:
+        parser.error("--items 需满足 1 <= MIN <= MAX")
+    if os.path.exists(args.path):
+        if not args.force:
+            print(f"[ERR] {args.path} 已存在，加 --force 覆盖", file=sys.stderr)
+            return 1
+        os.remove(args.path)
+    os.makedirs(os.path.dirname(os.path.abspath(args.path)), exist_ok=True)
+
+    result = generate(
+        args.path, args.products, args.customers, args.orders, tuple(args.items), args.days, args.seed
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from .common import free_port, login, start_server, summarize
+
+
+# 登录洪峰下普通接口的延迟：先测基线，再在同样的读负载上叠加一波并发登录，对比 p50/p95/p99
+#   cd backend && python -m bench.login_burst --readers 8 --logins 200
+
+
+def read_load(base: str, token: str, readers: int, seconds: float) -> list[float]:
+    latencies: list[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        local = []
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            session.get(f"{base}/products/page?page_size=20").raise_for_status()
+            local.append(time.perf_counter() - t)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def login_burst(base: str, count: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    lock = threading.Lock()
+    remaining = iter(range(count))
+
+    def worker():
+        session = requests.Session()
+        for _ in remaining:
+            t = time.perf_counter()
+            login(base, session)
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    # 数据库路径相对于当前目录，放到临时目录里跑，不碰项目自带的库
+    os.chdir(tempfile.mkdtemp(prefix="jxc-bench-"))
+    port = free_port()
+    server = start_server(port)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        token = login(base, requests.Session())
+        baseline = read_load(base, token, args.readers, args.seconds)
+
+        burst: list[float] = []
+        burst_thread = threading.Thread(
+            target=lambda: burst.extend(login_burst(base, args.logins, args.login_concurrency))
+        )
+        burst_thread.start()
+        under_burst = read_load(base, token, args.readers, args.seconds)
+        burst_thread.join()
+
+        print(json.dumps({
+            "baseline": summarize(baseline, args.seconds),
+            "during_login_burst": summarize(under_burst, args.seconds),
+            "logins": summarize(burst, args.seconds),
+        }, indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from .common import BACKEND_DIR, free_port, login, start_server, summarize
+
+
+# 按接口统计的混合负载：并发线程按权重随机挑场景打真实服务，输出每个接口的 p50/p95/p99 与吞吐（JSON）。
+# 默认先用 bench.datagen 在临时目录生成一个小库；--db 指定已生成的库时复制一份再跑，原文件不动，多次运行可比。
+#   cd backend && python -m bench.scenarios --concurrency 16 --seconds 30 --output run.json
+#   cd backend && python -m bench.scenarios --db /tmp/jxc-1m/jinxiaocun.db --compare run.json
+#   cd backend && python -m bench.scenarios --base-url http://127.0.0.1:8000   # 打已经在跑的服务
+
+# 场景名 -> 默认权重
+DEFAULT_MIX = {
+    "login": 1,
+    "products_page": 20,
+    "products_search": 10,
+    "orders_page": 20,
+    "orders_search": 5,
+    "order_get": 10,
+    "order_create": 5,
+    "order_update": 3,
+    "order_pay": 3,
+}
+
+# 比较时关注的指标；吞吐越大越好，延迟越小越好
+COMPARED = ("throughput", "p50_ms", "p95_ms", "p99_ms")
+
+
+class Context:
+    # 一次运行共用的信息：服务地址、令牌和各表的最大 id（随机挑选要访问的记录）
+    def __init__(self, base: str, token: str, max_ids: dict[str, int]):
+        self.base = base
+        self.token = token
+        self.max_ids = max_ids
+
+    def pick(self, rng: random.Random, table: str) -> int:
+        return rng.randint(1, max(1, self.max_ids[table]))
+
+    def order_items(self, rng: random.Random) -> list[dict]:
+        return [
+            {"product_id": self.pick(rng, "products"), "quantity": rng.randint(1, 3)}
+            for _ in range(rng.randint(1, 4))
+        ]
+
+
+def _max_id(session: requests.Session, base: str, path: str) -> int:
+    # 分页接口按 id 倒序，第一条就是最大 id
+    r = session.get(f"{base}{path}/page", params={"page_size": 1, "fields": "id", "with_total": "false"})
+    r.raise_for_status()
+    items = r.json()["items"]
+    return items[0]["id"] if items else 0
+
+
+# 场景函数：(ctx, 会话, 随机数) -> 响应；状态码 >= 400 记为错误
+def s_login(ctx, s, rng):
+    return s.post(f"{ctx.base}/auth/login", data={"username": "admin", "password": "admin"})
+
+
+def s_products_page(ctx, s, rng):
+    return s.get(f"{ctx.base}/products/page", params={"page": rng.randint(1, 50), "page_size": 20})
+
+
+def s_products_search(ctx, s, rng):
+    return s.get(f"{ctx.base}/products/page", params={"q": f"商品{ctx.pick(rng, 'products')}", "page_size": 20})
+
+
+def s_orders_page(ctx, s, rng):
+    return s.get(f"{ctx.base}/orders/page", params={"page": rng.randint(1, 50), "page_size": 20})
+
+
+def s_orders_search(ctx, s, rng):
+    return s.get(f"{ctx.base}/orders/page", params={"q": f"客户{ctx.pick(rng, 'customers')}", "page_size": 20})
+
+
+def s_order_get(ctx, s, rng):
+    return s.get(f"{ctx.base}/orders/{ctx.pick(rng, 'orders')}")
+
+
+def s_order_create(ctx, s, rng):
+    payload = {"customer_id": ctx.pick(rng, "customers"), "items": ctx.order_items(rng)}
+    return s.post(f"{ctx.base}/orders/", json=payload)
+
+
+def s_order_update(ctx, s, rng):
+    payload = {"customer_id": ctx.pick(rng, "customers"), "items": ctx.order_items(rng)}
+    return s.put(f"{ctx.base}/orders/{ctx.pick(rng, 'orders')}", json=payload)
+
+
+def s_order_pay(ctx, s, rng):
+    return s.post(f"{ctx.base}/orders/{ctx.pick(rng, 'orders')}/pay")
+
+
+SCENARIOS = {name: globals()[f"s_{name}"] for name in DEFAULT_MIX}
+
+
+def parse_mix(value: str | None) -> dict[str, int]:
+    # --mix products_page=10,order_create=2：只跑列出的场景；不传时用 DEFAULT_MIX
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"未知场景: {name}（可选: {', '.join(SCENARIOS)}）")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def run(ctx: Context, mix: dict[str, int], concurrency: int, seconds: float, warmup: float, seed: int) -> dict:
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    latencies: dict[str, list[float]] = {name: [] for name in names}
+    errors: dict[str, int] = {name: 0 for name in names}
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + seconds
+
+    def worker(n: int):
+        rng = random.Random(seed * 1000 + n)
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {ctx.token}"
+        local = {name: [] for name in names}
+        failed = {name: 0 for name in names}
+        while True:
+            name = rng.choices(names, weights)[0]
+            t = time.perf_counter()
+            if t >= deadline:
+                break
+            try:
+                ok = SCENARIOS[name](ctx, session, rng).status_code < 400
+            except requests.RequestException:
+                ok = False
+            if t < measure_from:
+                continue
+            local[name].append(time.perf_counter() - t)
+            if not ok:
+                failed[name] += 1
+        with lock:
+            for name in names:
+                latencies[name].extend(local[name])
+                errors[name] += failed[name]
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    endpoints = {name: {**summarize(latencies[name], seconds), "errors": errors[name]} for name in names}
+    everything = [v for values in latencies.values() for v in values]
+    total = {**summarize(everything, seconds), "errors": sum(errors.values())}
+    return {"total": total, "endpoints": endpoints}
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    # 每个指标给出 [基线, 本次, 本次/基线]；基线里没有的场景跳过
+    result = {}
+    pairs = [("total", current["total"], baseline.get("total"))]
+    pairs += [(name, stats, baseline.get("endpoints", {}).get(name)) for name, stats in current["endpoints"].items()]
+    for name, now, before in pairs:
+        if not before:
+            continue
+        result[name] = {
+            key: [before[key], now[key], round(now[key] / before[key], 3) if before[key] else None]
+            for key in COMPARED
+        }
+    return result
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="bench.datagen 生成的库；不传时生成一个小库")
+    parser.add_argument("--base-url", help="直接压已经在跑的服务，不自己起服务")
+    parser.add_argument("--workers", type=int, default=1, help="自己起服务时的 uvicorn worker 数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0, help="预热秒数，不计入结果")
+    parser.add_argument("--mix", help="场景权重，如 products_page=10,order_create=2")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果另存为 JSON 文件")
+    parser.add_argument("--compare", help="上一次运行的结果文件，附上逐项对比")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    server = None
+    workdir = None
+    if args.base_url:
+        base = args.base_url.rstrip("/")
+    else:
+        workdir = tempfile.mkdtemp(prefix="jxc-bench-")
+        target = os.path.join(workdir, "jinxiaocun.db")
+        if args.db:
+            shutil.copyfile(args.db, target)
+        else:
+            subprocess.run(
+                [sys.executable, "-m", "bench.datagen", target,
+                 "--products", "2000", "--customers", "1000", "--orders", "20000", "--seed", str(args.seed)],
+                cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL,
+            )
+        port = free_port()
+        server = start_server(port, cwd=workdir, workers=args.workers)
+        base = f"http://127.0.0.1:{port}"
+
+    try:
+        session = requests.Session()
+        token = login(base, session)
+        session.headers["Authorization"] = f"Bearer {token}"
+        max_ids = {table: _max_id(session, base, f"/{table}") for table in ("products", "customers", "orders")}
+        ctx = Context(base, token, max_ids)
+        result = run(ctx, mix, args.concurrency, args.seconds, args.warmup, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "db_mode": os.getenv("JXC_DB_MODE", "async"),
+            "workers": None if args.base_url else args.workers,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "seed": args.seed,
+            "mix": mix,
+            "max_ids": max_ids,
+        },
+        **result,
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["compare"] = compare(result, json.load(f))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 1 if result["total"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+# 列表序列化的两条路径对比：ORM 实例 + response_model（from_attributes）校验 + json.dumps，
+# 与列元组 + RowShape + FastJSONResponse。每个规模取多轮中的最好成绩，并核对两边输出逐字节一致
+#   cd backend && python -m bench.serialization --sizes 1000 10000 100000
+
+
+def seed(engine, rows: int) -> None:
+    from sqlalchemy import insert
+
+    from app.models import Order, OrderItem, Product
+
+    start = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"商品{i}", "sku": f"SKU-{i}", "price": 1.5 + i % 97 / 4, "stock": float(i % 500),
+             "description": None if i % 3 else f"描述{i}", "original_weight": "无"}
+            for i in range(rows)
+        ])
+        conn.execute(insert(Order), [
+            {"created_at": start + timedelta(seconds=i, microseconds=i % 7 * 1000), "customer_name": f"客户{i % 200}",
+             "customer_phone": "13800000000", "total_amount": 11.0, "status": "已付款" if i % 2 else "未付款"}
+            for i in range(rows)
+        ])
+        conn.execute(insert(OrderItem), [
+            {"order_id": i // 2 + 1, "product_id": i % rows + 1, "product_name": f"商品{i % rows}",
+             "unit_price": 5.5, "quantity": 1.0, "unit": "件", "subtotal": 5.5}
+            for i in range(rows * 2)
+        ])
+
+
+def best_of(fn, rounds: int) -> tuple[float, bytes]:
+    best, body = float("inf"), b""
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    # 数据库路径相对于当前目录，放到临时目录里跑，不碰项目自带的库
+    os.chdir(tempfile.mkdtemp(prefix="jxc-bench-"))
+
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session, selectinload
+
+    from app.database import Base
+    from app.models import Order, Product
+    from app.schemas import OrderOut, ProductOut
+    from app.serialization import FastJSONResponse, orjson
+    from app.routers.orders import ORDER_ROW, _order_dicts
+    from app.routers.products import PRODUCT_ROW
+
+    products_adapter = TypeAdapter(list[ProductOut])
+    orders_adapter = TypeAdapter(list[OrderOut])
+
+    def orm_path(adapter, load):
+        # 与 FastAPI 处理 response_model 的步骤相同：校验 -> 按 JSON 模式导出 -> JSONResponse
+        def run():
+            with Session(engine) as db:
+                validated = adapter.validate_python(load(db), from_attributes=True)
+                return JSONResponse(adapter.dump_python(validated, mode="json")).body
+        return run
+
+    def fast_path(load):
+        def run():
+            with Session(engine) as db:
+                items, plain = load(db)
+                return FastJSONResponse(items, plain).body
+        return run
+
+    # 没装 orjson 时 FastJSONResponse 退回 json.dumps，结果里注明用的是哪个编码器
+    results = {"encoder": "orjson" if orjson is not None else "json"}
+    for size in args.sizes:
+        engine = create_engine(f"sqlite:///bench-{size}.db")
+        Base.metadata.create_all(engine)
+        seed(engine, size)
+        cases = {
+            "products": (
+                orm_path(products_adapter, lambda db: db.query(Product).order_by(Product.id.desc()).all()),
+                fast_path(lambda db: PRODUCT_ROW.dump(db.query(*PRODUCT_ROW.columns).order_by(Product.id.desc()).all())),
+            ),
+            "orders": (
+                orm_path(orders_adapter, lambda db: db.query(Order).options(selectinload(Order.items)).order_by(Order.id.desc()).all()),
+                fast_path(lambda db: _order_dicts(db, db.query(*ORDER_ROW.columns).order_by(Order.id.desc()).all())),
+            ),
+        }
+        for name, (orm_run, fast_run) in cases.items():
+            orm_seconds, orm_body = best_of(orm_run, args.rounds)
+            fast_seconds, fast_body = best_of(fast_run, args.rounds)
+            results[f"{name}@{size}"] = {
+                "orm_ms": round(orm_seconds * 1000, 1),
+                "fast_ms": round(fast_seconds * 1000, 1),
+                "speedup": round(orm_seconds / fast_seconds, 2),
+                "bytes": len(fast_body),
+                "identical": orm_body == fast_body,
+            }
+        engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
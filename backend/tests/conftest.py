@@ -0,0 +1,13 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# 服务按当前目录下的 jinxiaocun.db 读库，SQLAlchemy 建引擎时就把相对路径转成了绝对路径：
+# 导入 app 之前先切到临时目录，测试建的新库不会写进仓库里的 jinxiaocun.db
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+_workdir = tempfile.mkdtemp(prefix="jxc-test-")
+os.chdir(_workdir)
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
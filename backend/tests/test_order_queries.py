@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import pagination
+from app.database import async_engine, engine
+from app.main import app
+
+
+# 订单读接口的 SQL 条数与每页条数、订单项个数无关（订单项整批预加载，不按订单逐条查）
+#   cd backend && python -m pytest tests
+
+
+@pytest.fixture(scope="module")
+def client():
+    # 库在 conftest 切过去的临时目录里，启动时由迁移新建
+    with TestClient(app) as c:
+        r = c.post("/auth/login", data={"username": "admin", "password": "admin"})
+        c.headers["Authorization"] = "Bearer " + r.json()["access_token"]
+        c.post("/customers/", json={"name": "李四", "phone": "13900000000"})
+        for product_id in (1, 2, 3):
+            c.put(f"/products/{product_id}", json={"stock": 100000})
+        for i in range(210):
+            items = [{"product_id": 1 + (i + n) % 3, "quantity": 1} for n in range(1 + i % 4)]
+            r = c.post("/orders/", json={"customer_id": 1 + i % 2, "items": items})
+            assert r.status_code == 200, r.text
+        r = c.post("/orders/", json={"customer_id": 1, "items": [{"product_id": 1, "quantity": 1}] * 20})
+        assert r.status_code == 200, r.text
+        c.big_order_id = r.json()["id"]
+        yield c
+
+
+@pytest.fixture
+def statements():
+    engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    executed: list[str] = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    for e in engines:
+        event.listen(e, "before_cursor_execute", count)
+    yield executed
+    for e in engines:
+        event.remove(e, "before_cursor_execute", count)
+
+
+def _count(client, statements, url: str) -> int:
+    # 总数缓存会让第二次请求少一条 COUNT，每次都从空缓存开始
+    pagination._count_cache.clear()
+    statements.clear()
+    r = client.get(url)
+    assert r.status_code == 200, r.text
+    return len(statements)
+
+
+@pytest.mark.parametrize("path", ["/orders/page", "/orders/"])
+def test_list_queries_independent_of_page_size(client, statements, path):
+    small = _count(client, statements, f"{path}?page=1&page_size=5")
+    large = _count(client, statements, f"{path}?page=1&page_size=200")
+    assert small == large
+
+
+def test_order_detail_queries_independent_of_item_count(client, statements):
+    small = _count(client, statements, "/orders/1")
+    large = _count(client, statements, f"/orders/{client.big_order_id}")
+    assert small == large